@@ -0,0 +1,98 @@
+# activity_buckets.py
+# Per-user activity over time. New activity lands in hourly buckets; a background job
+# folds old hourly buckets into daily ones and old daily buckets into weekly ones, and
+# drops weekly buckets past the last retention limit. Every bit of activity lives in
+# exactly one bucket, so the total over a range is just the sum of the buckets in it.
+
+HOUR = 3600
+DAY = 24 * HOUR
+WEEK = 7 * DAY
+
+# The Unix epoch fell on a Thursday, so weeks (Monday 00:00 UTC) start 4 days later
+WEEK_OFFSET = 4 * DAY
+
+HOURLY_RETENTION = 7 * DAY
+DAILY_RETENTION = 90 * DAY
+WEEKLY_RETENTION = 104 * WEEK
+
+COUNTERS = ('Messages Sent', 'Characters Typed', 'Minutes in Voice Chat', 'Minutes Online')
+
+
+def hour_start(timestamp):
+    return int(timestamp) // HOUR * HOUR
+
+
+def day_start(timestamp):
+    return int(timestamp) // DAY * DAY
+
+
+def week_start(timestamp):
+    return (int(timestamp) - WEEK_OFFSET) // WEEK * WEEK + WEEK_OFFSET
+
+
+def record(db, timestamp, rows):
+    """Adds (user_id, messages, characters, voice_minutes, online_minutes) rows to the hour containing timestamp."""
+    bucket = hour_start(timestamp)
+    db.executemany('''
+    INSERT INTO activity_buckets (ID, Resolution, "Bucket Start", "Messages Sent", "Characters Typed", "Minutes in Voice Chat", "Minutes Online")
+    VALUES (?, 'hour', ?, ?, ?, ?, ?)
+    ON CONFLICT(ID, Resolution, "Bucket Start") DO UPDATE SET
+        "Messages Sent" = "Messages Sent" + excluded."Messages Sent",
+        "Characters Typed" = "Characters Typed" + excluded."Characters Typed",
+        "Minutes in Voice Chat" = "Minutes in Voice Chat" + excluded."Minutes in Voice Chat",
+        "Minutes Online" = "Minutes Online" + excluded."Minutes Online"''',
+                   [(str(user_id), bucket, messages, characters, voice, online) for user_id, messages, characters, voice, online in rows])
+
+
+# SQL versions of day_start and week_start
+DAY_START_SQL = f'"Bucket Start" / {DAY} * {DAY}'
+WEEK_START_SQL = f'("Bucket Start" - {WEEK_OFFSET}) / {WEEK} * {WEEK} + {WEEK_OFFSET}'
+
+
+def _fold(db, source, target, target_start, cutoff):
+    # Moves every source bucket older than cutoff into the target bucket containing it
+    db.execute(f'''
+    INSERT INTO activity_buckets (ID, Resolution, "Bucket Start", "Messages Sent", "Characters Typed", "Minutes in Voice Chat", "Minutes Online")
+    SELECT ID, '{target}', {target_start}, SUM("Messages Sent"), SUM("Characters Typed"), SUM("Minutes in Voice Chat"), SUM("Minutes Online")
+    FROM activity_buckets WHERE Resolution = '{source}' AND "Bucket Start" < ?
+    GROUP BY ID, {target_start}
+    ON CONFLICT(ID, Resolution, "Bucket Start") DO UPDATE SET
+        "Messages Sent" = "Messages Sent" + excluded."Messages Sent",
+        "Characters Typed" = "Characters Typed" + excluded."Characters Typed",
+        "Minutes in Voice Chat" = "Minutes in Voice Chat" + excluded."Minutes in Voice Chat",
+        "Minutes Online" = "Minutes Online" + excluded."Minutes Online"''', (cutoff,))
+    return db.execute('DELETE FROM activity_buckets WHERE Resolution = ? AND "Bucket Start" < ?', (source, cutoff)).rowcount
+
+
+def roll_up(db, now):
+    """Downsamples old buckets. Returns how many (hourly, daily, weekly) buckets were folded or dropped."""
+    with db.transaction():
+        # Cutoffs sit on day/week boundaries so a target bucket only ever receives whole source buckets
+        hourly = _fold(db, 'hour', 'day', DAY_START_SQL, day_start(now - HOURLY_RETENTION))
+        daily = _fold(db, 'day', 'week', WEEK_START_SQL, week_start(now - DAILY_RETENTION))
+        weekly = db.execute('DELETE FROM activity_buckets WHERE Resolution = ? AND "Bucket Start" < ?', ('week', week_start(now - WEEKLY_RETENTION))).rowcount
+    return hourly, daily, weekly
+
+
+def totals(db, user_id, start, end):
+    """Sums a user's activity over [start, end) across every resolution."""
+    row = db.fetchone('''
+    SELECT COALESCE(SUM("Messages Sent"), 0), COALESCE(SUM("Characters Typed"), 0), COALESCE(SUM("Minutes in Voice Chat"), 0), COALESCE(SUM("Minutes Online"), 0)
+    FROM activity_buckets
+    WHERE ID = ? AND Resolution IN ('hour', 'day', 'week') AND "Bucket Start" >= ? AND "Bucket Start" < ?''', (str(user_id), start, end))
+    return dict(zip(COUNTERS, row))
+
+
+def daily_series(db, user_id, start, end):
+    """Returns [(day_start, counters)] for [start, end), oldest first. Weekly buckets count toward their first day."""
+    rows = db.fetchall('''
+    SELECT "Bucket Start", "Messages Sent", "Characters Typed", "Minutes in Voice Chat", "Minutes Online"
+    FROM activity_buckets
+    WHERE ID = ? AND Resolution IN ('hour', 'day', 'week') AND "Bucket Start" >= ? AND "Bucket Start" < ?''', (str(user_id), start, end))
+
+    days = {}
+    for bucket, *counters in rows:
+        day = days.setdefault(day_start(bucket), [0] * len(COUNTERS))
+        for i, value in enumerate(counters):
+            day[i] += value
+    return [(day, dict(zip(COUNTERS, days[day]))) for day in sorted(days)]
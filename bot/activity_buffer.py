@@ -0,0 +1,40 @@
+# activity_buffer.py
+import threading
+
+
+class ActivityBuffer:
+    """Coalesces per-message counters in memory until the next flush.
+
+    Every message only bumps a few integers here; ActivityTracker drains the buffer
+    on a timer (or once enough events pile up) and writes all of it in one transaction.
+    """
+
+    def __init__(self, max_events):
+        self.max_events = max_events
+        self._lock = threading.Lock()
+        self._pending = {}  # user_id -> [username, points, messages, characters]
+        self._events = 0
+
+    def add_message(self, user_id, username, points, characters):
+        """Record one message. Returns True when the buffer is due for a flush."""
+        with self._lock:
+            entry = self._pending.get(user_id)
+            if entry is None:
+                entry = self._pending[user_id] = [username, 0, 0, 0]
+            entry[0] = username
+            entry[1] += points
+            entry[2] += 1
+            entry[3] += characters
+            self._events += 1
+            return self._events >= self.max_events
+
+    def drain(self):
+        """Hand back everything buffered so far and start a fresh batch."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._events = 0
+        return pending
+
+    def __len__(self):
+        with self._lock:
+            return len(self._pending)
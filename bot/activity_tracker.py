@@ -4,13 +4,20 @@ from discord.ext import commands, tasks
 import os
 import asyncio
 import random
-import sqlite3
-from datetime import datetime, timezone
+import pytz
+from datetime import datetime, timezone, timedelta, time
 from gtts import gTTS
 from pydub import AudioSegment
 from settings.settings import load_settings
-
-DATABASE = 'data/databases/users.db'
+from bot.database import Database, DatabaseWorker, AsyncProxy, DATABASE
+from bot.activity_buffer import ActivityBuffer
+from bot.migrations import run_migrations
+from bot.user_cache import UserCache, RECORD_FIELDS
+from bot.leaderboard import Leaderboard
+from bot.aggregates import ServerAggregates
+from bot.voice_sessions import VoiceSessions, load_checkpoint, save_checkpoint
+from bot import ledger, activity_buckets, legacy_import
+from bot.levels import get_current_level, points_for_next_level, points_for_level_transition, level_for_points, levels_for_points_array
 
 settings = load_settings()
 coin_icon = settings['coin_icon']
@@ -20,33 +27,226 @@ MESSAGE_POINTS = 15
 ONLINE_POINTS = 2
 VOICE_CHAT_POINTS = 15
 
+# Message counters are buffered and written in one batch at most this often,
+# or sooner once this many messages have been buffered
+ACTIVITY_FLUSH_SECONDS = 0.5
+ACTIVITY_FLUSH_EVENTS = 200
+
+# Number of user records kept in memory in front of the database
+USER_CACHE_SIZE = 1024
+
+# Open voice sessions are credited and checkpointed this often
+VOICE_TICK_SECONDS = 60
+
+# daily_stats rolls over into daily_history at midnight in this timezone
+DAILY_ROLLOVER_TIMEZONE = pytz.timezone('US/Eastern')
+
+# How often balances are checked against the coin ledger
+LEDGER_RECONCILE_MINUTES = 10
+
 class ActivityTracker(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self.db = Database(DATABASE)
+        run_migrations(self.db)
+        # Coroutines use `await self.aio.<method>(...)`, which runs the same method on
+        # the database worker thread instead of blocking the event loop
+        self.db_worker = DatabaseWorker()
+        self.aio = AsyncProxy(self, self.db_worker)
+        self.activity_buffer = ActivityBuffer(ACTIVITY_FLUSH_EVENTS)
+        self.user_cache = UserCache(USER_CACHE_SIZE)
+        self.leaderboards = {'Coins': Leaderboard(), 'Points': Leaderboard()}
+        self.seed_leaderboards()
+        self.aggregates = ServerAggregates()
+        self.seed_aggregates()
+        self.voice_sessions = VoiceSessions()
+        # guild_id -> {user_id: username} for members who aren't offline, kept current by presence events
+        self.online_members = {}
+        # Level-ups detected on the worker thread are handed to the event loop through
+        # this queue, which a single task drains to send the announcements
+        self.level_ups = asyncio.Queue()
+        self.loop = None
+        self.level_up_announcer = None
         self.reset_daily_stats.start()
         self.track_activity.start()
+        self.flush_activity.start()
+        self.reconcile_ledger.start()
+        self.roll_up_activity.start()
+        self.track_voice.start()
+
+    async def cog_load(self):
+        self.loop = asyncio.get_running_loop()
+        self.level_up_announcer = asyncio.create_task(self.announce_level_ups())
+
+    def cog_unload(self):
+        if self.level_up_announcer:
+            self.level_up_announcer.cancel()
+        self.reset_daily_stats.cancel()
+        self.track_activity.cancel()
+        self.flush_activity.cancel()
+        self.reconcile_ledger.cancel()
+        self.roll_up_activity.cancel()
+        self.track_voice.cancel()
+        self.db_worker.stop()
+        # Write out whatever is still buffered before the connections go away
+        self.flush_activity_buffer()
+        self.credit_voice_minutes(self.voice_sessions.tick(datetime.now(timezone.utc).timestamp()))
+        save_checkpoint(self.voice_sessions.snapshot())
+        self.db.close()
 
     def execute_query(self, query, params=()):
-        conn = sqlite3.connect(DATABASE)
-        c = conn.cursor()
-        c.execute(query, params)
-        conn.commit()
-        conn.close()
+        self.db.execute(query, params)
+        # A raw statement can touch any row, so cached records can no longer be trusted
+        self.db.on_commit(self.user_cache.clear)
+        self.db.on_commit(self.seed_leaderboards)
+        self.db.on_commit(self.seed_aggregates)
 
     def fetch_query(self, query, params=()):
-        conn = sqlite3.connect(DATABASE)
-        c = conn.cursor()
-        c.execute(query, params)
-        result = c.fetchall()
-        conn.close()
-        return result
-
-    @tasks.loop(hours=24)
+        return self.db.fetchall(query, params)
+
+    def cache_adjust(self, changes):
+        # Write-through for (user_id, field, delta) changes, applied once the transaction commits.
+        # Changes to the lifetime totals also feed the server aggregates.
+        def apply():
+            for user_id, field, delta in changes:
+                self.user_cache.adjust(user_id, field, delta)
+                self.aggregates.adjust(user_id, field, delta)
+        self.db.on_commit(apply)
+
+    def cache_set(self, user_id, field, value):
+        self.db.on_commit(lambda: self.user_cache.set(user_id, field, value))
+
+    def seed_leaderboards(self):
+        rows = self.db.fetchall('SELECT ID, Coins, Points FROM user_info')
+        self.leaderboards['Coins'].seed((user_id, coins) for user_id, coins, _ in rows)
+        self.leaderboards['Points'].seed((user_id, points) for user_id, _, points in rows)
+
+    def seed_aggregates(self):
+        self.aggregates.seed(self.db.fetchall('SELECT ID, "Total Messages Sent", "Total Minutes in Voice Chat", "Total Minutes Online" FROM user_stats'))
+
+    def publish(self, metric, values):
+        # Moves (user_id, value) pairs on a leaderboard once the transaction commits
+        def apply():
+            for user_id, value in values:
+                self.leaderboards[metric].update(user_id, value)
+        self.db.on_commit(apply)
+
+    def ensure_user(self, user_id, username):
+        self.ensure_users([(user_id, username)])
+
+    def ensure_users(self, users):
+        # Creates the rows for each (user_id, username) in all three tables the first time we see them.
+        # Usernames only live in user_info and are refreshed whenever someone renames themselves.
+        with self.db.transaction():
+            self.db.executemany('''
+            INSERT INTO user_info (ID, Username, Level, Points, Coins)
+            VALUES (?, ?, 1, 0, 0)
+            ON CONFLICT(ID) DO UPDATE SET Username = excluded.Username
+            WHERE Username IS NOT excluded.Username''', users)
+            ids = [(user_id,) for user_id, _ in users]
+            self.db.executemany('INSERT OR IGNORE INTO user_stats (ID) VALUES (?)', ids)
+            self.db.executemany('INSERT OR IGNORE INTO daily_stats (ID) VALUES (?)', ids)
+            for user_id, username in users:
+                self.cache_set(user_id, 'Username', username)
+
+            def add_new_users():
+                for user_id, _ in users:
+                    for leaderboard in self.leaderboards.values():
+                        leaderboard.add(user_id)
+                    self.aggregates.add(user_id)
+            self.db.on_commit(add_new_users)
+
+    def flush_activity_buffer(self):
+        pending = self.activity_buffer.drain()
+        if not pending:
+            return
+
+        users, user_info_rows, user_stats_rows, daily_stats_rows, bucket_rows = [], [], [], [], []
+        for user_id, (username, points, messages, characters) in pending.items():
+            users.append((user_id, username))
+            user_info_rows.append((points, user_id))
+            user_stats_rows.append((messages, characters, user_id))
+            daily_stats_rows.append((points, messages, characters, user_id))
+            bucket_rows.append((user_id, messages, characters, 0, 0))
+
+        with self.db.transaction():
+            self.ensure_users(users)
+            self.db.executemany('UPDATE user_info SET Points = Points + ? WHERE ID = ?', user_info_rows)
+            self.check_levels_for(list(pending))
+            self.db.executemany('UPDATE user_stats SET "Total Messages Sent" = "Total Messages Sent" + ?, "Total Characters Typed" = "Total Characters Typed" + ? WHERE ID = ?', user_stats_rows)
+            self.db.executemany('UPDATE daily_stats SET "Points Today" = "Points Today" + ?, "Messages Sent Today" = "Messages Sent Today" + ?, "Characters Typed Today" = "Characters Typed Today" + ? WHERE ID = ?', daily_stats_rows)
+            activity_buckets.record(self.db, datetime.now(timezone.utc).timestamp(), bucket_rows)
+            changes = []
+            for user_id, (_, points, messages, characters) in pending.items():
+                changes += [(user_id, 'Points', points), (user_id, 'Total Messages Sent', messages), (user_id, 'Total Characters Typed', characters)]
+            self.cache_adjust(changes)
+
+    @tasks.loop(seconds=ACTIVITY_FLUSH_SECONDS)
+    async def flush_activity(self):
+        await self.aio.flush_activity_buffer()
+
+    @tasks.loop()
     async def reset_daily_stats(self):
-        now = datetime.now(timezone.utc)
-        if now.hour == 5:  # 5 AM UTC, midnight EST
-            self.execute_query('UPDATE daily_stats SET "Points Today" = 0, "Messages Sent Today" = 0, "Characters Typed Today" = 0, "Minutes Online Today" = 0, "Minutes in Voice Chat Today" = 0')
-            print("Reset daily stats")
+        # Each pass rolls over any day that has ended (the first pass catches up on
+        # rollovers missed while the bot was down), then sleeps until the next midnight
+        today = datetime.now(DAILY_ROLLOVER_TIMEZONE).date()
+        archived_day = await self.aio.roll_over_daily_stats(today)
+        if archived_day:
+            print(f"Archived daily stats for {archived_day} and reset the counters")
+
+        next_midnight = DAILY_ROLLOVER_TIMEZONE.localize(datetime.combine(today + timedelta(days=1), time()))
+        await discord.utils.sleep_until(next_midnight)
+
+    def get_state(self, key, default=None):
+        row = self.db.fetchone('SELECT Value FROM bot_state WHERE Key = ?', (key,))
+        return row[0] if row else default
+
+    def set_state(self, key, value):
+        self.db.execute('INSERT INTO bot_state (Key, Value) VALUES (?, ?) ON CONFLICT(Key) DO UPDATE SET Value = excluded.Value', (key, value))
+
+    def roll_over_daily_stats(self, today):
+        """Archives daily_stats under the day they were collected for and zeroes them.
+
+        Returns the archived day, or None if today's counters are still current.
+        """
+        today = today.isoformat()
+        with self.db.transaction():
+            current_day = self.get_state('Daily Stats Day')
+            if current_day is None:
+                # First run: whatever is in daily_stats belongs to today
+                self.set_state('Daily Stats Day', today)
+                return None
+            if current_day >= today:
+                return None
+
+            # Only active users get a history row
+            self.db.execute('''
+            INSERT OR REPLACE INTO daily_history (ID, Day, Points, "Messages Sent", "Characters Typed", "Minutes Online", "Minutes in Voice Chat")
+            SELECT ID, ?, "Points Today", "Messages Sent Today", "Characters Typed Today", "Minutes Online Today", "Minutes in Voice Chat Today"
+            FROM daily_stats
+            WHERE "Points Today" + "Messages Sent Today" + "Characters Typed Today" + "Minutes Online Today" + "Minutes in Voice Chat Today" > 0''', (current_day,))
+            self.db.execute('UPDATE daily_stats SET "Points Today" = 0, "Messages Sent Today" = 0, "Characters Typed Today" = 0, "Minutes Online Today" = 0, "Minutes in Voice Chat Today" = 0')
+            self.set_state('Daily Stats Day', today)
+            return current_day
+
+    @tasks.loop(hours=1)
+    async def roll_up_activity(self):
+        await self.aio.roll_up_activity_buckets()
+
+    def roll_up_activity_buckets(self):
+        return activity_buckets.roll_up(self.db, datetime.now(timezone.utc).timestamp())
+
+    def get_activity(self, user_id, days):
+        """Returns a user's activity totals and per-day series for the last `days` days."""
+        end = datetime.now(timezone.utc).timestamp()
+        start = activity_buckets.day_start(end) - (days - 1) * activity_buckets.DAY
+        return activity_buckets.totals(self.db, user_id, start, end + 1), activity_buckets.daily_series(self.db, user_id, start, end + 1)
+
+    def get_daily_history(self, user_id, start_day, end_day):
+        """Returns a user's archived days in [start_day, end_day] (ISO dates), oldest first."""
+        return self.db.fetchall('''
+        SELECT Day, Points, "Messages Sent", "Characters Typed", "Minutes Online", "Minutes in Voice Chat"
+        FROM daily_history WHERE ID = ? AND Day BETWEEN ? AND ? ORDER BY Day''', (str(user_id), start_day, end_day))
 
     @reset_daily_stats.before_loop
     async def before_reset_daily_stats(self):
@@ -54,41 +254,127 @@ class ActivityTracker(commands.Cog):
 
     @tasks.loop(minutes=5)
     async def track_activity(self):
+        # Merge the online sets (members in several guilds are only credited once),
+        # then apply the whole tick as one transaction on a worker thread
+        online_users = {}
+        for members in self.online_members.values():
+            online_users.update(members)
+
+        if online_users:
+            await self.aio.credit_online_minutes(list(online_users.items()))
+
+    @track_activity.before_loop
+    async def before_track_activity(self):
+        await self.bot.wait_until_ready()
+        self.seed_presence()
+
+    def seed_presence(self):
+        # The one full member scan, at startup and after reconnecting when presence events may have been missed
+        self.online_members = {}
         for guild in self.bot.guilds:
             for member in guild.members:
-                if member.status != discord.Status.offline and not member.bot:
-                    user_id = str(member.id)
-                    username = member.name
-                    existing_user = self.fetch_query('SELECT 1 FROM user_info WHERE ID = ?', (user_id,))
-                    if not existing_user:
-                        self.execute_query('''
-                        INSERT INTO user_info (ID, Username, Level, Points, Coins)
-                        VALUES (?, ?, 1, 0, 0)''', (user_id, username))
-                        self.execute_query('''
-                        INSERT INTO user_stats (ID, Username, "Total Messages Sent", "Total Characters Typed", "Total Minutes Online", "Total Minutes in Voice Chat", "Last Daily", "Last Loan Disbursement", "Voice Join Time")
-                        VALUES (?, ?, 0, 0, 0, 0, NULL, NULL, NULL)''', (user_id, username))
-                        self.execute_query('''
-                        INSERT INTO daily_stats (ID, Username, "Points Today", "Messages Sent Today", "Characters Typed Today", "Minutes Online Today", "Minutes in Voice Chat Today")
-                        VALUES (?, ?, 0, 0, 0, 0, 0)''', (user_id, username))
-                    self.execute_query('UPDATE user_stats SET "Total Minutes Online" = "Total Minutes Online" + ? WHERE ID = ?', (ONLINE_POINTS, user_id))
-                    self.execute_query('UPDATE daily_stats SET "Minutes Online Today" = "Minutes Online Today" + ? WHERE ID = ?', (ONLINE_POINTS, user_id))
-
-    def update_user_activity(self, user, points=0, coins=0):
+                self.set_presence(member)
+
+    def set_presence(self, member):
+        if member.bot:
+            return
+        members = self.online_members.setdefault(member.guild.id, {})
+        if member.status != discord.Status.offline:
+            members[str(member.id)] = member.name
+        else:
+            members.pop(str(member.id), None)
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        self.seed_presence()
+
+    @commands.Cog.listener()
+    async def on_presence_update(self, before, after):
+        self.set_presence(after)
+
+    @commands.Cog.listener()
+    async def on_member_join(self, member):
+        self.set_presence(member)
+
+    @commands.Cog.listener()
+    async def on_member_remove(self, member):
+        self.online_members.get(member.guild.id, {}).pop(str(member.id), None)
+
+    def credit_online_minutes(self, users):
+        rows = [(ONLINE_POINTS, user_id) for user_id, _ in users]
+        with self.db.transaction():
+            self.ensure_users(users)
+            self.db.executemany('UPDATE user_stats SET "Total Minutes Online" = "Total Minutes Online" + ? WHERE ID = ?', rows)
+            self.db.executemany('UPDATE daily_stats SET "Minutes Online Today" = "Minutes Online Today" + ? WHERE ID = ?', rows)
+            activity_buckets.record(self.db, datetime.now(timezone.utc).timestamp(), [(user_id, 0, 0, 0, minutes) for minutes, user_id in rows])
+            self.cache_adjust([(user_id, 'Total Minutes Online', minutes) for minutes, user_id in rows])
+
+    def update_user_activity(self, user, points=0, coins=0, reason=ledger.ADJUSTMENT, source=None):
         user_id = str(user.id)
-        username = user.name
-        existing_user = self.fetch_query('SELECT 1 FROM user_info WHERE ID = ?', (user_id,))
-        if not existing_user:
-            self.execute_query('''
-            INSERT INTO user_info (ID, Username, Level, Points, Coins)
-            VALUES (?, ?, 1, 0, 0)''', (user_id, username))
-            self.execute_query('''
-            INSERT INTO user_stats (ID, Username, "Total Messages Sent", "Total Characters Typed", "Total Minutes Online", "Total Minutes in Voice Chat", "Last Daily", "Last Loan Disbursement", "Voice Join Time")
-            VALUES (?, ?, 0, 0, 0, 0, NULL, NULL, NULL)''', (user_id, username))
-            self.execute_query('''
-            INSERT INTO daily_stats (ID, Username, "Points Today", "Messages Sent Today", "Characters Typed Today", "Minutes Online Today", "Minutes in Voice Chat Today")
-            VALUES (?, ?, 0, 0, 0, 0, 0)''', (user_id, username))
-        self.execute_query('UPDATE user_info SET Points = Points + ?, Coins = Coins + ? WHERE ID = ?', (points, coins, user_id))
-        self.execute_query('UPDATE daily_stats SET "Points Today" = "Points Today" + ? WHERE ID = ?', (points, user_id))
+        with self.db.transaction():
+            self.ensure_user(user_id, user.name)
+            balance, level, total_points = self.db.fetchone('UPDATE user_info SET Points = Points + ?, Coins = Coins + ? WHERE ID = ? RETURNING Coins, Level, Points', (points, coins, user_id))
+            self.db.execute('UPDATE daily_stats SET "Points Today" = "Points Today" + ? WHERE ID = ?', (points, user_id))
+            self.cache_adjust([(user_id, 'Points', points), (user_id, 'Coins', coins)])
+            if coins:
+                ledger.record(self.db, [(user_id, coins, balance, reason, source)])
+                self.publish('Coins', [(user_id, balance)])
+            if points:
+                self.check_levels([(user_id, level, total_points)])
+
+    def check_levels(self, rows):
+        # Takes (user_id, stored level, points) after a points change. A level only moves
+        # when the points leave that level's band, which is two O(1) threshold comparisons.
+        # Every points change comes through here, so it also keeps the points leaderboard current.
+        self.publish('Points', [(user_id, points) for user_id, _, points in rows])
+        changed = []
+        for user_id, level, points in rows:
+            level = level or 1
+            if points_for_next_level(level - 1) <= points < points_for_next_level(level):
+                continue
+            changed.append((level_for_points(points), user_id, level))
+
+        if not changed:
+            return
+
+        self.db.executemany('UPDATE user_info SET Level = ? WHERE ID = ?', [(new_level, user_id) for new_level, user_id, _ in changed])
+        for new_level, user_id, previous_level in changed:
+            self.cache_set(user_id, 'Level', new_level)
+            if new_level > previous_level:
+                self.queue_level_up(user_id, previous_level, new_level)
+
+    def check_levels_for(self, user_ids):
+        placeholders = ', '.join('?' * len(user_ids))
+        self.check_levels(self.db.fetchall(f'SELECT ID, Level, Points FROM user_info WHERE ID IN ({placeholders})', user_ids))
+
+    def queue_level_up(self, user_id, previous_level, new_level):
+        # Runs on the worker thread, so the event is only handed to the loop once the
+        # level change has actually committed
+        if self.loop is None:
+            return
+        event = (user_id, previous_level, new_level)
+        self.db.on_commit(lambda: self.loop.call_soon_threadsafe(self.level_ups.put_nowait, event))
+
+    def find_member(self, user_id):
+        for guild in self.bot.guilds:
+            member = guild.get_member(int(user_id))
+            if member:
+                return member
+        return None
+
+    async def announce_level_ups(self):
+        while True:
+            user_id, previous_level, new_level = await self.level_ups.get()
+            member = self.find_member(user_id)
+            if member is None:
+                continue
+
+            try:
+                await self.announce_level_up_in_main_chat(member, previous_level, new_level)
+                if member.voice and member.voice.channel and member.guild.voice_client is None:
+                    await self.announce_level_up_in_voice(member, previous_level, new_level)
+            except Exception as e:
+                print(f"Failed to announce level up for {member.name}: {e}")
 
     async def announce_level_up_in_main_chat(self, user, previous_level, new_level):
         main_channel = discord.utils.get(user.guild.text_channels, name='licker-talk')
@@ -109,7 +395,7 @@ class ActivityTracker(commands.Cog):
             await main_channel.send(f"{digits} {coin_icon}")
 
             user_id = str(user.id)
-            self.execute_query('UPDATE user_info SET Coins = Coins + ? WHERE ID = ?', (generated_coins, user_id))
+            await self.aio.update_coins(user_id, generated_coins, ledger.LEVEL_UP, 'level_up_announcement')
 
     async def announce_level_up_in_voice(self, user, previous_level, new_level):
         voice_channel = user.voice.channel
@@ -145,65 +431,100 @@ class ActivityTracker(commands.Cog):
         if os.path.exists(new_tts_file_path):
             os.remove(new_tts_file_path)
 
-    def update_user_coins(self, user, coins):
+    def update_user_coins(self, user, coins, reason=ledger.ADJUSTMENT, source=None):
         user_id = str(user.id)
-        username = user.name
-        existing_user = self.fetch_query('SELECT 1 FROM user_info WHERE ID = ?', (user_id,))
-        if not existing_user:
-            self.execute_query('''
-            INSERT INTO user_info (ID, Username, Level, Points, Coins)
-            VALUES (?, ?, 1, 0, 0)''', (user_id, username))
-            self.execute_query('''
-            INSERT INTO user_stats (ID, Username, "Total Messages Sent", "Total Characters Typed", "Total Minutes Online", "Total Minutes in Voice Chat", "Last Daily", "Last Loan Disbursement", "Voice Join Time")
-            VALUES (?, ?, 0, 0, 0, 0, NULL, NULL, NULL)''', (user_id, username))
-            self.execute_query('''
-            INSERT INTO daily_stats (ID, Username, "Points Today", "Messages Sent Today", "Characters Typed Today", "Minutes Online Today", "Minutes in Voice Chat Today")
-            VALUES (?, ?, 0, 0, 0, 0, 0)''', (user_id, username))
-        self.execute_query('UPDATE user_info SET Coins = Coins + ? WHERE ID = ?', (coins, user_id))
-
-    def transfer_coins(self, from_user, to_user, amount):
+        with self.db.transaction():
+            self.ensure_user(user_id, user.name)
+            return self.update_coins(user_id, coins, reason, source)
+
+    def transfer_coins(self, from_user, to_user, amount, reason=ledger.GIFT, source='!gift'):
         from_user_id = str(from_user.id)
         to_user_id = str(to_user.id)
 
-        if not self.fetch_query('SELECT 1 FROM user_info WHERE ID = ?', (from_user_id,)) or not self.fetch_query('SELECT 1 FROM user_info WHERE ID = ?', (to_user_id,)):
-            return False, "User data not found."
+        with self.db.transaction():
+            self.ensure_user(to_user_id, to_user.name)
+            from_row = self.db.fetchone('UPDATE user_info SET Coins = Coins - ? WHERE ID = ? AND Coins >= ? RETURNING Coins', (amount, from_user_id, amount))
+            if from_row is None:
+                if self.db.fetchone('SELECT 1 FROM user_info WHERE ID = ?', (from_user_id,)) is None:
+                    return False, "User data not found."
+                return False, "Insufficient balance."
+            to_row = self.db.fetchone('UPDATE user_info SET Coins = Coins + ? WHERE ID = ? RETURNING Coins', (amount, to_user_id))
 
-        from_user_balance = self.fetch_query('SELECT Coins FROM user_info WHERE ID = ?', (from_user_id,))[0][0]
-        if from_user_balance < amount:
-            return False, "Insufficient balance."
-
-        self.execute_query('UPDATE user_info SET Coins = Coins - ? WHERE ID = ?', (amount, from_user_id))
-        self.execute_query('UPDATE user_info SET Coins = Coins + ? WHERE ID = ?', (amount, to_user_id))
+            self.cache_set(from_user_id, 'Coins', from_row[0])
+            self.cache_set(to_user_id, 'Coins', to_row[0])
+            self.publish('Coins', [(from_user_id, from_row[0]), (to_user_id, to_row[0])])
+            ledger.record(self.db, [(from_user_id, -amount, from_row[0], reason, source), (to_user_id, amount, to_row[0], reason, source)])
 
         return True, f"Transferred {amount} coins from {from_user.name} to {to_user.name}."
 
     @commands.Cog.listener()
     async def on_message(self, message):
         if not message.author.bot:
-            self.update_user_activity(message.author, points=MESSAGE_POINTS)
-            self.execute_query('UPDATE user_stats SET "Total Messages Sent" = "Total Messages Sent" + 1, "Total Characters Typed" = "Total Characters Typed" + ? WHERE ID = ?', (len(message.content), str(message.author.id)))
-            self.execute_query('UPDATE daily_stats SET "Messages Sent Today" = "Messages Sent Today" + 1, "Characters Typed Today" = "Characters Typed Today" + ? WHERE ID = ?', (len(message.content), str(message.author.id)))
+            flush_due = self.activity_buffer.add_message(str(message.author.id), message.author.name, MESSAGE_POINTS, len(message.content))
+            if flush_due:
+                await self.aio.flush_activity_buffer()
+
+    def voice_state(self, member, state):
+        # Deafened members and the AFK channel don't earn voice time
+        afk_channel = member.guild.afk_channel
+        paused = state.self_deaf or state.deaf or (afk_channel is not None and state.channel == afk_channel)
+        return state.channel.id, paused
 
     @commands.Cog.listener()
     async def on_voice_state_update(self, member, before, after):
-        if not member.bot:
-            user_id = str(member.id)
-            username = member.name
-            if before.channel is None and after.channel is not None:
-                # User has joined a voice channel
-                print(f"{member.name} has joined a voice channel.")
-                self.execute_query('UPDATE user_stats SET "Voice Join Time" = ? WHERE ID = ?', (datetime.now().timestamp(), user_id))
-
-            elif before.channel is not None and after.channel is None:
-                # User has left a voice channel
-                join_time = self.fetch_query('SELECT "Voice Join Time" FROM user_stats WHERE ID = ?', (user_id,))[0][0]
-                if join_time:
-                    time_spent = datetime.now().timestamp() - join_time
-                    points_earned = int(time_spent / 60) * VOICE_CHAT_POINTS
-                    print(f"{member.name} has left the voice channel. Points earned: {points_earned}.")
-                    self.update_user_activity(member, points=points_earned)
-                    self.execute_query('UPDATE user_stats SET "Total Minutes in Voice Chat" = "Total Minutes in Voice Chat" + ?, "Voice Join Time" = NULL WHERE ID = ?', (int(time_spent / 60), user_id))
-                    self.execute_query('UPDATE daily_stats SET "Minutes in Voice Chat Today" = "Minutes in Voice Chat Today" + ? WHERE ID = ?', (int(time_spent / 60), user_id))
+        if member.bot:
+            return
+
+        user_id = str(member.id)
+        now = datetime.now(timezone.utc).timestamp()
+        if after.channel is None:
+            if before.channel is not None:
+                print(f"{member.name} has left the voice channel.")
+                self.voice_sessions.leave(user_id, now)
+        elif before.channel is None:
+            print(f"{member.name} has joined a voice channel.")
+            self.voice_sessions.join(user_id, member.name, *self.voice_state(member, after), now)
+        else:
+            # Moved channels, (un)muted, (un)deafened or went AFK
+            self.voice_sessions.update(user_id, member.name, *self.voice_state(member, after), now)
+
+    @tasks.loop(seconds=VOICE_TICK_SECONDS)
+    async def track_voice(self):
+        credited = self.voice_sessions.tick(datetime.now(timezone.utc).timestamp())
+        if credited:
+            await self.aio.credit_voice_minutes(credited)
+        await self.db_worker.run(save_checkpoint, self.voice_sessions.snapshot())
+
+    @track_voice.before_loop
+    async def before_track_voice(self):
+        # Pick up sessions that were open when the bot last stopped
+        await self.bot.wait_until_ready()
+        live = {}
+        for guild in self.bot.guilds:
+            for channel in guild.voice_channels:
+                for member in channel.members:
+                    if not member.bot:
+                        live[str(member.id)] = (member.name, *self.voice_state(member, member.voice))
+        checkpoint = await self.db_worker.run(load_checkpoint)
+        self.voice_sessions.restore(checkpoint, live, datetime.now(timezone.utc).timestamp())
+
+    def credit_voice_minutes(self, rows):
+        # Takes (user_id, username, minutes) for everyone credited this tick and applies them in one transaction
+        if not rows:
+            return
+
+        point_rows = [(minutes * VOICE_CHAT_POINTS, user_id) for user_id, _, minutes in rows]
+        minute_rows = [(minutes, user_id) for user_id, _, minutes in rows]
+        with self.db.transaction():
+            self.ensure_users([(user_id, username) for user_id, username, _ in rows])
+            self.db.executemany('UPDATE user_info SET Points = Points + ? WHERE ID = ?', point_rows)
+            self.db.executemany('UPDATE user_stats SET "Total Minutes in Voice Chat" = "Total Minutes in Voice Chat" + ? WHERE ID = ?', minute_rows)
+            self.db.executemany('UPDATE daily_stats SET "Points Today" = "Points Today" + ?, "Minutes in Voice Chat Today" = "Minutes in Voice Chat Today" + ? WHERE ID = ?',
+                                [(minutes * VOICE_CHAT_POINTS, minutes, user_id) for user_id, _, minutes in rows])
+            activity_buckets.record(self.db, datetime.now(timezone.utc).timestamp(), [(user_id, 0, 0, minutes, 0) for user_id, _, minutes in rows])
+            self.cache_adjust([(user_id, 'Points', points) for points, user_id in point_rows] +
+                              [(user_id, 'Total Minutes in Voice Chat', minutes) for minutes, user_id in minute_rows])
+            self.check_levels_for([user_id for user_id, _, _ in rows])
 
     def get_statistics(self, user_id):
         return {
@@ -212,78 +533,198 @@ class ActivityTracker(commands.Cog):
             'daily_stats': self.fetch_query('SELECT * FROM daily_stats WHERE ID = ?', (user_id,))
         }
     
+    def get_server_comparison(self, user_id):
+        """Returns {metric: (user value, server summary, user's percentile)} for the aggregated totals."""
+        record = self.get_user_record(user_id)
+        comparison = {}
+        for metric in ServerAggregates.METRICS:
+            value = record[metric] if record else 0
+            comparison[metric] = (value, self.aggregates.summary(metric), self.aggregates.percentile_of(metric, value))
+        return comparison
+
+    def get_user_record(self, user_id):
+        # One cached record per user covering user_info and the user_stats totals
+        user_id = str(user_id)
+        record = self.user_cache.get(user_id)
+        if record is not None:
+            return record
+
+        row = self.db.fetchone('''
+        SELECT i.Username, i.Level, i.Points, i.Coins, s."Total Messages Sent", s."Total Characters Typed",
+               s."Total Minutes Online", s."Total Minutes in Voice Chat"
+        FROM user_info i LEFT JOIN user_stats s ON s.ID = i.ID
+        WHERE i.ID = ?''', (user_id,))
+        if row is None:
+            return None
+
+        record = dict(zip(RECORD_FIELDS, (value if value is not None else 0 for value in row)))
+        self.user_cache.put(user_id, record)
+        return record
+
     def get_coins(self, user_id):
-        balance = self.fetch_query('SELECT Coins FROM user_info WHERE ID = ?', (user_id,))
-        return balance[0][0] if balance else 0
+        record = self.get_user_record(user_id)
+        return record['Coins'] if record else 0
     
     def get_level(self, user_id):
-        level = self.fetch_query('SELECT Level FROM user_info WHERE ID = ?', (user_id,))
-        return level[0][0] if level else 0
+        record = self.get_user_record(user_id)
+        return record['Level'] if record else 0
 
     def get_points(self, user_id):
-        points = self.fetch_query('SELECT Points FROM user_info WHERE ID = ?', (user_id,))
-        return points[0][0] if points else 0
+        record = self.get_user_record(user_id)
+        return record['Points'] if record else 0
     
-    def update_coins(self, user_id, amount):
-        current_balance = self.get_coins(user_id)
-
-        new_balance = current_balance + amount
+    # Balance mutations are single conditional statements so concurrent bets, gifts and
+    # muggings can't overwrite each other's results. Every coin change is written to the
+    # ledger in the same transaction, tagged with a reason code and the command or game
+    # behind it. Each returns the new value, or None when nothing was changed.
+    def update_coins(self, user_id, amount, reason=ledger.ADJUSTMENT, source=None):
+        """Adds amount (which may be negative) to a balance, flooring it at 0."""
+        user_id = str(user_id)
+        with self.db.transaction():
+            if amount < 0:
+                # The ledger needs the amount actually taken once the floor applies
+                row = self.db.fetchone('SELECT Coins FROM user_info WHERE ID = ?', (user_id,))
+                if row is None:
+                    return None
+                amount = max(amount, -row[0])
+
+            row = self.db.fetchone('UPDATE user_info SET Coins = Coins + ? WHERE ID = ? RETURNING Coins', (amount, user_id))
+            if row is None:
+                return None
+            self.cache_set(user_id, 'Coins', row[0])
+            self.publish('Coins', [(user_id, row[0])])
+            if amount:
+                ledger.record(self.db, [(user_id, amount, row[0], reason, source)])
+            return row[0]
 
-        if new_balance < 0:
-            new_balance = 0
-
-        self.execute_query('UPDATE user_info SET Coins = ? WHERE ID = ?', (new_balance, user_id))
-
-        return new_balance
-    
     def update_points(self, user_id, amount):
-        current_balance = self.get_points(user_id)
+        user_id = str(user_id)
+        with self.db.transaction():
+            row = self.db.fetchone('UPDATE user_info SET Points = MAX(Points + ?, 0) WHERE ID = ? RETURNING Points, Level', (amount, user_id))
+            if row is None:
+                return None
+            self.cache_set(user_id, 'Points', row[0])
+            self.check_levels([(user_id, row[1], row[0])])
+            return row[0]
+
+    def debit_coins(self, user_id, amount, reason=ledger.BET, source=None):
+        """Takes amount from a balance only if it can cover it."""
+        user_id = str(user_id)
+        with self.db.transaction():
+            row = self.db.fetchone('UPDATE user_info SET Coins = Coins - ? WHERE ID = ? AND Coins >= ? RETURNING Coins', (amount, user_id, amount))
+            if row is None:
+                return None
+            self.cache_set(user_id, 'Coins', row[0])
+            self.publish('Coins', [(user_id, row[0])])
+            ledger.record(self.db, [(user_id, -amount, row[0], reason, source)])
+            return row[0]
+
+    def debit_all_coins(self, user_id, reason=ledger.BET, source=None):
+        """Empties a balance and returns how much was taken."""
+        user_id = str(user_id)
+        with self.db.transaction():
+            row = self.db.fetchone('SELECT Coins FROM user_info WHERE ID = ?', (user_id,))
+            if row is None or row[0] <= 0:
+                return 0
+            self.db.execute('UPDATE user_info SET Coins = 0 WHERE ID = ?', (user_id,))
+            self.cache_set(user_id, 'Coins', 0)
+            self.publish('Coins', [(user_id, 0)])
+            ledger.record(self.db, [(user_id, -row[0], 0, reason, source)])
+            return row[0]
+
+    def claim_cooldown_reward(self, user_id, column, previous_claim, claimed_at, recipient_id, coins, reason, source):
+        """Stamps a cooldown column and credits the reward together.
+
+        The stamp only lands if the column still holds previous_claim, so a reward
+        claimed twice at once pays out once. Returns the recipient's new balance.
+        """
+        if column not in ('Last Daily', 'Last Loan Disbursement'):
+            raise ValueError(f"Unknown cooldown column: {column}")
+
+        with self.db.transaction():
+            cursor = self.db.execute(f'UPDATE user_stats SET "{column}" = ? WHERE ID = ? AND "{column}" IS ?', (claimed_at, str(user_id), previous_claim))
+            if cursor.rowcount == 0:
+                return None
+            return self.update_coins(recipient_id, coins, reason, source)
+
+    def reconcile_balances(self):
+        adjustments = ledger.reconcile(self.db)
+        for user_id, difference, balance, _, _ in adjustments:
+            print(f"Ledger reconciliation: balance for {user_id} was off by {difference}, recorded an adjustment (balance {balance})")
+        return adjustments
+
+    @tasks.loop(minutes=LEDGER_RECONCILE_MINUTES)
+    async def reconcile_ledger(self):
+        await self.aio.reconcile_balances()
+
+    def backfill_levels(self):
+        """Recomputes the Level column for every user in one pass. Returns how many rows changed."""
+        rows = self.db.fetchall('SELECT ID, Level, Points FROM user_info')
+        if not rows:
+            return 0
+
+        ids, old_levels, points = zip(*rows)
+        levels = levels_for_points_array([p or 0 for p in points]).tolist()
+        changed = [(level, user_id) for user_id, old_level, level in zip(ids, old_levels, levels) if old_level != level]
+
+        with self.db.transaction():
+            self.db.executemany('UPDATE user_info SET Level = ? WHERE ID = ?', changed)
+            for level, user_id in changed:
+                self.cache_set(user_id, 'Level', level)
+        return len(changed)
+
+    def import_legacy_data(self):
+        """Merges player_data.json and the old users table into the current tables. Safe to re-run."""
+        results = legacy_import.import_legacy(self.db)
+        # The import writes straight to the tables, so rebuild everything derived from them
+        self.user_cache.clear()
+        self.seed_leaderboards()
+        self.seed_aggregates()
+        self.backfill_levels()
+        return results
+
+    def get_upgrade_levels(self, user_id):
+        return dict(self.db.fetchall('SELECT Upgrade, Level FROM user_upgrades WHERE ID = ?', (str(user_id),)))
+
+    def raise_upgrade_level(self, user_id, username, upgrade, max_level):
+        """Raises an upgrade by one level unless it's already at max_level. Returns the new level or None."""
+        with self.db.transaction():
+            self.ensure_user(str(user_id), username)
+            row = self.db.fetchone('''
+            INSERT INTO user_upgrades (ID, Upgrade, Level) VALUES (?, ?, 1)
+            ON CONFLICT(ID, Upgrade) DO UPDATE SET Level = Level + 1 WHERE Level < ?
+            RETURNING Level''', (str(user_id), upgrade, max_level))
+            return row[0] if row else None
 
-        new_balance = current_balance + amount
-
-        if new_balance < 0:
-            new_balance = 0
-
-        self.execute_query('UPDATE user_info SET Points = ? WHERE ID = ?', (new_balance, user_id))
-
-        return new_balance
-    
     def get_top_users_by_coins(self):
-        return self.fetch_query('SELECT ID, Username, Coins FROM user_info ORDER BY Coins DESC LIMIT 10')
-    
+        return [(user_id, self.get_user_record(user_id)['Username'], coins) for user_id, coins in self.leaderboards['Coins'].top(10)]
+
     def get_points_leaderboard(self):
-        return self.fetch_query('SELECT ID, Username, Level, Points, Coins FROM user_info ORDER BY Points DESC LIMIT 10')
+        rows = []
+        for user_id, points in self.leaderboards['Points'].top(10):
+            record = self.get_user_record(user_id)
+            rows.append((user_id, record['Username'], record['Level'], points, record['Coins']))
+        return rows
+
+    def get_rank(self, user_id, metric):
+        """Returns (rank, total users, percentile) for a user on the Coins or Points leaderboard."""
+        rank, total = self.leaderboards[metric].rank(user_id)
+        # Share of users this user is ahead of or tied with
+        percentile = (total - rank + 1) / total * 100
+        return rank, total, percentile
+
+    def get_leaderboard_version(self, metric):
+        return self.leaderboards[metric].version
 
     def get_from_database(self, user_id, data_item):
-        query_switch = {
-            "Total Minutes in Voice Chat": 'Select "Total Minutes in Voice Chat" FROM user_stats WHERE ID = ?',
-            "Total Minutes Online": 'Select "Total Minutes Online" FROM user_stats WHERE ID = ?',
-            "Total Messages Sent": 'Select "Total Messages Sent" FROM user_stats WHERE ID = ?',
-            "Total Characters Typed": 'Select "Total Characters Typed" FROM user_stats WHERE ID = ?',
-        }
-        
-        query = query_switch.get(data_item)
-
-        if query:
-            result = self.fetch_query(query, (user_id,))
-            return result[0][0] if result else 0
-        else:
+        if data_item not in ("Total Minutes in Voice Chat", "Total Minutes Online", "Total Messages Sent", "Total Characters Typed"):
             return None
 
-def points_for_level_transition(level):
-    return 10000 if level == 1 else (level + 1) * 5000
-
-def points_for_next_level(current_level):
-    total_points = 0
-    for level in range(1, current_level + 1):
-        total_points += points_for_level_transition(level)
-    return total_points
+        record = self.get_user_record(user_id)
+        return record[data_item] if record else 0
 
-def get_current_level(points):
-    level = 1
-    while points >= points_for_next_level(level):
-        level += 1
-    return level, points_for_next_level(level) - points_for_next_level(level - 1)
+    def get_cache_stats(self):
+        return self.user_cache.stats()
 
 async def setup(bot):
     await bot.add_cog(ActivityTracker(bot))
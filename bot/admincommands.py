@@ -1,6 +1,7 @@
 import discord
 from discord.ext import commands
 from settings.settings import load_settings
+from bot import ledger
 
 # Load settings
 settings = load_settings()
@@ -9,7 +10,7 @@ coin_icon = settings['coin_icon']
 # Replace this with your admin user ID
 ADMIN_ID = 1170556246257057888
 
-admin_commands = ["givecoins", "takecoins", "printid"]
+admin_commands = ["givecoins", "takecoins", "printid", "cachestats", "backfilllevels", "importlegacy"]
 
 class AdminCommands(commands.Cog):
     def __init__(self, bot):
@@ -34,7 +35,7 @@ class AdminCommands(commands.Cog):
         
         ActivityTracker = self.bot.get_cog('ActivityTracker')
         if ActivityTracker:
-            ActivityTracker.update_coins(member.id, coin_amt)
+            await ActivityTracker.aio.update_coins(member.id, coin_amt, ledger.ADMIN, '!givecoins')
             await ctx.send(f"Added {coin_amt} {coin_icon} to {username}'s account.")
         else:
             await ctx.send("ActivityTracker cog not found.")
@@ -53,22 +54,13 @@ class AdminCommands(commands.Cog):
 
         ActivityTracker = self.bot.get_cog('ActivityTracker')
         if ActivityTracker:
-            current_balance = ActivityTracker.get_coins(member.id)
-            print(f"DEBUG: Retrieved balance for {username}: {current_balance}, type: {type(current_balance)}")  # Debugging line
-
-            # Convert current_balance to an integer, handling any potential issues
-            if isinstance(current_balance, str):
-                current_balance = int(current_balance)
-
             coin_amt = int(coin_amt)  # Ensure coin_amt is an integer
 
-            print(f"DEBUG: Converted balance for {username}: {current_balance}, type: {type(current_balance)}")  # Debugging line after conversion
-            
-            if current_balance < coin_amt:
+            if await ActivityTracker.aio.debit_coins(member.id, coin_amt, ledger.ADMIN, '!takecoins') is None:
+                current_balance = await ActivityTracker.aio.get_coins(member.id)
                 await ctx.send(f"{username} does not have enough {coin_icon}. Current balance: {current_balance} {coin_icon}.")
                 return
 
-            ActivityTracker.update_coins(member.id, -coin_amt)
             await ctx.send(f"Removed {coin_amt} {coin_icon} from {username}'s account.")
         else:
             await ctx.send("ActivityTracker cog not found.")
@@ -87,6 +79,49 @@ class AdminCommands(commands.Cog):
 
         await ctx.send(f"{username}'s ID is {member.id}.")
 
+    @commands.command(name='cachestats')
+    async def cache_stats(self, ctx):
+        """Shows how well the user record cache is doing."""
+        if not self.is_admin(ctx.author):
+            await ctx.send("You are not authorized to use this command.")
+            return
+
+        ActivityTracker = self.bot.get_cog('ActivityTracker')
+        if ActivityTracker:
+            stats = ActivityTracker.get_cache_stats()
+            await ctx.send(f"User cache: {stats['size']}/{stats['capacity']} records, {stats['hits']} hits, {stats['misses']} misses, "
+                           f"{stats['evictions']} evictions ({stats['hit_rate']:.1%} hit rate).")
+        else:
+            await ctx.send("ActivityTracker cog not found.")
+
+    @commands.command(name='backfilllevels')
+    async def backfill_levels(self, ctx):
+        """Recomputes every user's level from their points."""
+        if not self.is_admin(ctx.author):
+            await ctx.send("You are not authorized to use this command.")
+            return
+
+        ActivityTracker = self.bot.get_cog('ActivityTracker')
+        if ActivityTracker:
+            changed = await ActivityTracker.aio.backfill_levels()
+            await ctx.send(f"Recomputed levels. {changed} users changed level.")
+        else:
+            await ctx.send("ActivityTracker cog not found.")
+
+    @commands.command(name='importlegacy')
+    async def import_legacy(self, ctx):
+        """Merges player_data.json and the old users table into the current tables. Resumes if interrupted."""
+        if not self.is_admin(ctx.author):
+            await ctx.send("You are not authorized to use this command.")
+            return
+
+        ActivityTracker = self.bot.get_cog('ActivityTracker')
+        if ActivityTracker:
+            results = await ActivityTracker.aio.import_legacy_data()
+            await ctx.send("Legacy import finished. " + " ".join(f"{source}: {merged} records merged, {created} new users." for source, (merged, created) in results.items()))
+        else:
+            await ctx.send("ActivityTracker cog not found.")
+
     @commands.Cog.listener()
     async def on_message(self, message):
         if not message.content.startswith("((@@"):
@@ -0,0 +1,143 @@
+# aggregates.py
+import math
+import threading
+
+# Relative accuracy of the quantile sketch: a reported quantile is within 2% of the true value
+SKETCH_ACCURACY = 0.02
+
+
+class QuantileSketch:
+    """Streaming quantile estimates over non-negative values (a DDSketch-style log histogram).
+
+    Values share a bucket when they are within SKETCH_ACCURACY of each other, so the
+    number of buckets depends only on the range of values, not on how many there are.
+    Values can be removed again, which lets a user's old total be swapped for a new one.
+    """
+
+    def __init__(self, accuracy=SKETCH_ACCURACY):
+        self.gamma = (1 + accuracy) / (1 - accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self._buckets = {}
+        self.zeros = 0
+        self.count = 0
+
+    def _key(self, value):
+        return math.ceil(math.log(value) / self._log_gamma)
+
+    def _value(self, key):
+        # Midpoint of the bucket's range, which keeps the relative error below the accuracy
+        return 2 * self.gamma ** key / (self.gamma + 1)
+
+    def add(self, value, count=1):
+        if value <= 0:
+            self.zeros += count
+        else:
+            key = self._key(value)
+            self._buckets[key] = self._buckets.get(key, 0) + count
+            if self._buckets[key] == 0:
+                del self._buckets[key]
+        self.count += count
+
+    def remove(self, value):
+        self.add(value, -1)
+
+    def quantile(self, q):
+        if self.count <= 0:
+            return 0
+        rank = q * (self.count - 1)
+        seen = self.zeros
+        if rank < seen:
+            return 0
+        for key in sorted(self._buckets):
+            seen += self._buckets[key]
+            if rank < seen:
+                return self._value(key)
+        return self._value(max(self._buckets))
+
+    def fraction_at_or_below(self, value):
+        if self.count <= 0:
+            return 0.0
+        at_or_below = self.zeros
+        if value > 0:
+            limit = self._key(value)
+            at_or_below += sum(count for key, count in self._buckets.items() if key <= limit)
+        return at_or_below / self.count
+
+
+class RunningStat:
+    """Count, sum and sum of squares of one per-user total, plus a quantile sketch of it."""
+
+    def __init__(self):
+        self._values = {}
+        self.total = 0
+        self.sum_of_squares = 0
+        self.sketch = QuantileSketch()
+
+    @property
+    def count(self):
+        return len(self._values)
+
+    def adjust(self, user_id, delta):
+        old = self._values.get(user_id)
+        new = (old or 0) + delta
+        if old is not None:
+            self.sketch.remove(old)
+        self._values[user_id] = new
+        self.total += new - (old or 0)
+        self.sum_of_squares += new * new - (old or 0) ** 2
+        self.sketch.add(new)
+
+    def add(self, user_id):
+        if user_id not in self._values:
+            self.adjust(user_id, 0)
+
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def stddev(self):
+        if not self.count:
+            return 0.0
+        mean = self.mean()
+        return math.sqrt(max(self.sum_of_squares / self.count - mean * mean, 0.0))
+
+    def summary(self):
+        return {'mean': self.mean(), 'stddev': self.stddev(), 'median': self.sketch.quantile(0.5),
+                'p90': self.sketch.quantile(0.9), 'count': self.count}
+
+
+class ServerAggregates:
+    """Server-wide distributions of the lifetime totals in user_stats."""
+
+    METRICS = ('Total Messages Sent', 'Total Minutes in Voice Chat', 'Total Minutes Online')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stats = {metric: RunningStat() for metric in self.METRICS}
+
+    def seed(self, rows):
+        # rows are (user_id, messages, voice minutes, online minutes), in METRICS order
+        with self._lock:
+            self.stats = {metric: RunningStat() for metric in self.METRICS}
+            for user_id, *values in rows:
+                for metric, value in zip(self.METRICS, values):
+                    self.stats[metric].adjust(str(user_id), value or 0)
+
+    def adjust(self, user_id, metric, delta):
+        if metric not in self.stats:
+            return
+        with self._lock:
+            self.stats[metric].adjust(str(user_id), delta)
+
+    def add(self, user_id):
+        # New users count toward the distributions with totals of 0
+        with self._lock:
+            for stat in self.stats.values():
+                stat.add(str(user_id))
+
+    def summary(self, metric):
+        with self._lock:
+            return self.stats[metric].summary()
+
+    def percentile_of(self, metric, value):
+        with self._lock:
+            return self.stats[metric].sketch.fraction_at_or_below(value) * 100
@@ -1,23 +1,27 @@
 # commands.py
 from discord.ext import commands
 import discord
-from utils.graphics import generate_level_image, generate_statistics_visualization
+from utils.render_pool import render_pool, RenderError
+from utils.render_cache import cached_render
+from utils.image_files import image_file
+from utils.avatars import AvatarService
+from utils.level_card import AVATAR_SIZE
 import pandas as pd
 from datetime import datetime, timedelta
 import random
 import pytz
 from settings.settings import load_settings
+from bot import ledger
 import subprocess
 import sys
 import os
 import asyncio
 from discord.ui import View
-from bot.activity_tracker import get_current_level, points_for_next_level
+from bot.levels import get_current_level, points_for_next_level
 import yt_dlp as youtube_dl
 from pydub import AudioSegment
 from dotenv import load_dotenv
 from tabulate import tabulate
-import matplotlib.pyplot as plt
 from gtts import gTTS
 from pydub import AudioSegment
 
@@ -51,7 +55,7 @@ class GeneralCommands(commands.Cog):
             await ctx.send(f"You cannot gift {coin_icon} to yourself.")
             return
 
-        success, message = ActivityTracker.transfer_coins(ctx.author, recipient, amount)
+        success, message = await ActivityTracker.aio.transfer_coins(ctx.author, recipient, amount, ledger.GIFT, '!gift')
         
         if success:
             await ctx.send(f"{ctx.author.mention} gifted {amount} {coin_icon} to {recipient.mention} for: {reason}")
@@ -61,96 +65,52 @@ class GeneralCommands(commands.Cog):
     @commands.command(name='forbeslist')
     async def forbeslist(self, ctx):
         ActivityTracker = self.bot.get_cog('ActivityTracker')
-        top_users = ActivityTracker.get_top_users_by_coins()
+        top_users = await ActivityTracker.aio.get_top_users_by_coins()
 
-        # Create DataFrame
-        data = {
-            "Rank": list(range(1, len(top_users) + 1)),
-            "Player Name": [self.bot.get_user(int(user_id)).display_name if self.bot.get_user(int(user_id)) else username for user_id, username, _ in top_users],
-            "Coins": [f"{coins:,}" for _, _, coins in top_users]  # This formats the coins with commas
-        }
-        df = pd.DataFrame(data)
-
-        # Plot the table with a cleaner style
-        fig, ax = plt.subplots(figsize=(5, 2))  # Adjusted figsize for better appearance
-        ax.axis('tight')
-        ax.axis('off')
-
-        # Create table
-        table = ax.table(cellText=df.values, colLabels=df.columns, cellLoc='center', loc='center', edges='horizontal')
-        table.auto_set_font_size(False)
-        table.set_fontsize(10)
-        table.scale(1.2, 1.2)  # Scale up the table for better readability
-
-        # Customize header row
-        for key, cell in table.get_celld().items():
-            cell.set_edgecolor('black')
-            cell.set_linewidth(1)
-            if key[0] == 0:
-                cell.set_text_props(weight='bold', color='black') # This should work for the background color
-
-        # Save the table as an image
-        image_path = 'utils/images/forbes_list.png'
-        plt.savefig(image_path, bbox_inches='tight', dpi=300)
+        # Only what ends up in the table goes into the cache key, so the image is reused until a shown row changes
+        columns = ["Rank", "Player Name", "Coins"]
+        rows = [
+            [rank, self.bot.get_user(int(user_id)).display_name if self.bot.get_user(int(user_id)) else username, f"{coins:,}"]  # This formats the coins with commas
+            for rank, (user_id, username, coins) in enumerate(top_users, start=1)
+        ]
+
+        try:
+            image = await cached_render('table', columns=columns, rows=rows, figsize=(5, 2), fontsize=10, scale=(1.2, 1.2), linewidth=1)
+        except RenderError as e:
+            await ctx.send(f"Couldn't draw the Forbes list: {e}")
+            return
 
         # Send the image in Discord
-        file = discord.File(image_path, filename='forbes_list.png')
+        file = image_file(image, 'forbes_list.png')
         embed = discord.Embed(title="Forbes List")
         embed.set_image(url="attachment://forbes_list.png")
         await ctx.send(embed=embed, file=file)
 
-        # Clean up the saved image file
-        os.remove(image_path)
-
     @commands.command(name='leaderboard')
     async def leaderboard(self, ctx):
         ActivityTracker = self.bot.get_cog('ActivityTracker')
-        top_users = ActivityTracker.get_points_leaderboard()
-
-        # Create DataFrame
-        data = {
-            "Rank": list(range(1, len(top_users) + 1)),
-            "Player Name": [
-                self.bot.get_user(int(user_id)).display_name if self.bot.get_user(int(user_id)) else username 
-                for user_id, username, level, points, coins in top_users
-            ],
-            "Level": [level for _, _, level, _, _ in top_users],
-            "Points": [f"{points:,}" for _, _, _, points, _ in top_users],
-            "Coins": [f"{coins:,}" for _, _, _, _, coins in top_users]  # This formats the coins with commas
-        }
-        df = pd.DataFrame(data)
-
-        # Plot the table with a cleaner style
-        fig, ax = plt.subplots(figsize=(6, 5))  # Adjusted figsize for better appearance
-        ax.axis('tight')
-        ax.axis('off')
-
-        # Create table
-        table = ax.table(cellText=df.values, colLabels=df.columns, cellLoc='center', loc='center', edges='horizontal')
-        table.auto_set_font_size(False)
-        table.set_fontsize(15)
-        table.scale(1.5, 2.0)  # Scale up the table for better readability
-
-        # Customize header row
-        for key, cell in table.get_celld().items():
-            cell.set_edgecolor('black')
-            cell.set_linewidth(1.5)
-            if key[0] == 0:
-                cell.set_text_props(weight='bold', color='black')  # Bold headers
-
-        # Save the table as an image
-        image_path = 'utils/images/leaderboard.png'
-        plt.savefig(image_path, bbox_inches='tight', dpi=300)
+        top_users = await ActivityTracker.aio.get_points_leaderboard()
+
+        # Only what ends up in the table goes into the cache key, so the image is reused until a shown row changes
+        columns = ["Rank", "Player Name", "Level", "Points", "Coins"]
+        rows = [
+            [rank, self.bot.get_user(int(user_id)).display_name if self.bot.get_user(int(user_id)) else username,
+             level, f"{points:,}", f"{coins:,}"]  # This formats the points and coins with commas
+            for rank, (user_id, username, level, points, coins) in enumerate(top_users, start=1)
+        ]
+
+        try:
+            image = await cached_render('table', columns=columns, rows=rows, figsize=(6, 5), fontsize=15, scale=(1.5, 2.0), linewidth=1.5)
+        except RenderError as e:
+            await ctx.send(f"Couldn't draw the leaderboard: {e}")
+            return
 
         # Send the image in Discord
-        file = discord.File(image_path, filename='leaderboard.png')
+        file = image_file(image, 'leaderboard.png')
         embed = discord.Embed(title="Leaderboard")
         embed.set_image(url="attachment://leaderboard.png")
         await ctx.send(embed=embed, file=file)
 
-        # Clean up the saved image file
-        os.remove(image_path)
-
     @commands.command(name='daily')
     async def daily(self, ctx):
         if ctx.channel.id != 1252055670778368013 and ctx.channel.id != 1259664562924552213:
@@ -160,7 +120,7 @@ class GeneralCommands(commands.Cog):
         user_id = str(ctx.author.id)
         ActivityTracker = self.bot.get_cog('ActivityTracker')
 
-        last_daily = ActivityTracker.fetch_query('SELECT "Last Daily" FROM user_stats WHERE ID = ?', (user_id,))
+        last_daily = await ActivityTracker.aio.fetch_query('SELECT "Last Daily" FROM user_stats WHERE ID = ?', (user_id,))
         last_daily = last_daily[0][0]
 
         if not last_daily:
@@ -193,13 +153,10 @@ class GeneralCommands(commands.Cog):
             await ctx.send(f"{accumulated_digits}")
             await asyncio.sleep(0.5)
 
-        coin_balance = ActivityTracker.fetch_query('SELECT Coins FROM user_info WHERE ID = ?', (user_id,))
-        coin_balance = coin_balance[0][0]
-
-        new_balance = coin_balance + daily_coins
-
-        ActivityTracker.execute_query('UPDATE user_info SET Coins = ? WHERE ID = ?', (new_balance, user_id))
-        ActivityTracker.execute_query('UPDATE user_stats SET "Last Daily" = ? WHERE ID = ?', (now.strftime('%Y-%m-%d %H:%M:%S'), user_id))
+        new_balance = await ActivityTracker.aio.claim_cooldown_reward(user_id, 'Last Daily', last_daily, now.strftime('%Y-%m-%d %H:%M:%S'), user_id, daily_coins, ledger.DAILY, '!daily')
+        if new_balance is None:
+            await ctx.send(f"You have already claimed your daily {coin_icon}.")
+            return
 
         await ctx.send(f"You have been rewarded {daily_coins} {coin_icon} for the day!  Your balance is now {new_balance} {coin_icon}.")
         
@@ -212,7 +169,7 @@ class GeneralCommands(commands.Cog):
         user_id = str(ctx.author.id)
         ActivityTracker = self.bot.get_cog('ActivityTracker')
 
-        last_loan_disbursement = ActivityTracker.fetch_query('SELECT "Last Loan Disbursement" FROM user_stats WHERE ID = ?', (user_id,))
+        last_loan_disbursement = await ActivityTracker.aio.fetch_query('SELECT "Last Loan Disbursement" FROM user_stats WHERE ID = ?', (user_id,))
 
         if last_loan_disbursement and last_loan_disbursement[0][0]:
             last_loan_disbursement = last_loan_disbursement[0][0]
@@ -255,17 +212,11 @@ class GeneralCommands(commands.Cog):
             await ctx.send(f"{accumulated_digits}")
             await asyncio.sleep(0.5)
         
-        random_member_balance = ActivityTracker.fetch_query('SELECT Coins FROM user_info WHERE ID = ?', (random_member_id,))
-
-        if random_member_balance:
-            random_member_balance = random_member_balance[0][0]
-        else:
-            random_member_balance = 0
-
-        new_balance = random_member_balance + loan_amount
-
-        ActivityTracker.execute_query('UPDATE user_info SET Coins = ? WHERE ID = ?', (new_balance, random_member_id))
-        ActivityTracker.execute_query('UPDATE user_stats SET "Last Loan Disbursement" = ? WHERE ID = ?', (now.strftime('%Y-%m-%d %H:%M:%S'), user_id))
+        await ActivityTracker.aio.ensure_users([(user_id, ctx.author.name), (random_member_id, random_member.name)])
+        new_balance = await ActivityTracker.aio.claim_cooldown_reward(user_id, 'Last Loan Disbursement', last_loan_disbursement, now.strftime('%Y-%m-%d %H:%M:%S'), random_member_id, loan_amount, ledger.LOAN, '!loandisbursement')
+        if new_balance is None:
+            await ctx.send(f"You have already signaled a loan disbursement today.")
+            return
 
         await ctx.send(f"{random_member.mention} has been rewarded {loan_amount} {coin_icon} for the day! Their balance is now {new_balance} {coin_icon}.")
 
@@ -323,7 +274,7 @@ class GeneralCommands(commands.Cog):
             user_name = ctx.author.display_name
 
         ActivityTracker = self.bot.get_cog('ActivityTracker')
-        coins = ActivityTracker.get_coins(user_id)
+        coins = await ActivityTracker.aio.get_coins(user_id)
 
         if mentioned_user == ctx.author:
             await ctx.send(f"{ctx.author.mention}, you have {coins} {coin_icon} in your account.")
@@ -392,6 +343,10 @@ class LevelUIView(View):
 class LevelUI(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self.avatars = AvatarService(AVATAR_SIZE)
+
+    async def cog_unload(self):
+        await self.avatars.close()
 
     @commands.command(name='level')
     async def level(self, ctx, member: discord.Member = None):
@@ -401,22 +356,24 @@ class LevelUI(commands.Cog):
         ActivityTracker = self.bot.get_cog('ActivityTracker')
 
         username = member.display_name
-        avatar_url = member.avatar.url
-        points = ActivityTracker.get_points(member.id)
+        points = await ActivityTracker.aio.get_points(member.id)
         current_level, remaining_points = get_current_level(points)
         next_level = current_level + 1
         progress_percentage = (points - points_for_next_level(current_level - 1)) / remaining_points * 100
 
-        image_buffer = generate_level_image(username, current_level, progress_percentage, points, next_level, avatar_url)
-    
-        if image_buffer:
-            file = discord.File(image_buffer, filename="level_image.png")
-            embed = discord.Embed(title="Level Information", color=discord.Color.orange())
-            embed.set_image(url="attachment://level_image.png")
-
-            await ctx.send(embed=embed, file=file)
-        else:
+        avatar = await self.avatars.get(member)
+        try:
+            image = await render_pool.render('level_card', username=username, level=current_level, progress=progress_percentage,
+                                             points=points, next_level=next_level, avatar=avatar)
+        except RenderError:
             await ctx.send("An error occurred while generating the level image.")
+            return
+
+        file = image_file(image, "level_image.png")
+        embed = discord.Embed(title="Level Information", color=discord.Color.orange())
+        embed.set_image(url="attachment://level_image.png")
+
+        await ctx.send(embed=embed, file=file)
 
     @commands.command(name='leaderboard_today')
     async def leaderboard_today(self, ctx):
@@ -445,29 +402,79 @@ class LevelUI(commands.Cog):
         user_id = member.id
 
         if ActivityTracker:
+            points = await ActivityTracker.aio.get_points(user_id)
+            level = await ActivityTracker.aio.get_level(user_id)
+            minutes_in_voice = await ActivityTracker.aio.get_from_database(user_id, "Total Minutes in Voice Chat")
+            minutes_online = await ActivityTracker.aio.get_from_database(user_id, "Total Minutes Online")
+            messages_sent = await ActivityTracker.aio.get_from_database(user_id, "Total Messages Sent")
+            characters_typed = await ActivityTracker.aio.get_from_database(user_id, "Total Characters Typed")
+
             embed = discord.Embed(title="Statistics", color=discord.Color.purple())
             embed.add_field(name="Username", value=f"**{member.display_name}**", inline=True)
-            embed.add_field(name="Total Points", value=ActivityTracker.get_points(user_id), inline=True)
-            embed.add_field(name="Level", value=ActivityTracker.get_level(user_id), inline=True)
-            embed.add_field(name="Total Minutes in Voice Chat", value=ActivityTracker.get_from_database(user_id, "Total Minutes in Voice Chat"), inline=True)
-            embed.add_field(name="Total Minutes Online", value=ActivityTracker.get_from_database(user_id, "Total Minutes Online"), inline=True)
-            embed.add_field(name="Total Messages Sent", value=ActivityTracker.get_from_database(user_id, "Total Messages Sent"), inline=True)
-            embed.add_field(name="Total Characters Typed", value=ActivityTracker.get_from_database(user_id, "Total Characters Typed"), inline=True)
+            embed.add_field(name="Total Points", value=points, inline=True)
+            embed.add_field(name="Level", value=level, inline=True)
+            embed.add_field(name="Total Minutes in Voice Chat", value=minutes_in_voice, inline=True)
+            embed.add_field(name="Total Minutes Online", value=minutes_online, inline=True)
+            embed.add_field(name="Total Messages Sent", value=messages_sent, inline=True)
+            embed.add_field(name="Total Characters Typed", value=characters_typed, inline=True)
 
             await ctx.send(embed=embed)
         else:
             await ctx.send("No statistics available for this user.")
 
+    @commands.command(name='rank')
+    async def rank(self, ctx, member: discord.Member = None):
+        if member is None:
+            member = ctx.author
+
+        ActivityTracker = self.bot.get_cog("ActivityTracker")
+        coins_rank, total, coins_percentile = ActivityTracker.get_rank(member.id, 'Coins')
+        points_rank, _, points_percentile = ActivityTracker.get_rank(member.id, 'Points')
+
+        embed = discord.Embed(title="Rank", color=discord.Color.gold())
+        embed.add_field(name="Username", value=f"**{member.display_name}**", inline=False)
+        embed.add_field(name="Points Rank", value=f"#{points_rank:,} of {total:,} ({points_percentile:.1f} percentile)", inline=True)
+        embed.add_field(name=f"{coin_icon} Rank", value=f"#{coins_rank:,} of {total:,} ({coins_percentile:.1f} percentile)", inline=True)
+
+        await ctx.send(embed=embed)
+
+    @commands.command(name='activity')
+    async def activity(self, ctx, days: int = 7, *, member: discord.Member = None):
+        if member is None:
+            member = ctx.author
+
+        days = max(1, min(days, 365))
+        ActivityTracker = self.bot.get_cog("ActivityTracker")
+        totals, series = await ActivityTracker.aio.get_activity(member.id, days)
+
+        embed = discord.Embed(title=f"Activity - Last {days} Days", color=discord.Color.purple())
+        embed.add_field(name="Username", value=f"**{member.display_name}**", inline=False)
+        for name, value in totals.items():
+            embed.add_field(name=name, value=value, inline=True)
+
+        if series:
+            # Most recent 14 days with any activity, as a small table
+            table = tabulate(
+                [[datetime.utcfromtimestamp(day).strftime('%m-%d'), counters['Messages Sent'], counters['Minutes in Voice Chat'], counters['Minutes Online']] for day, counters in series[-14:]],
+                headers=["Day", "Msgs", "Voice", "Online"])
+            embed.add_field(name="By Day", value=f"```\n{table}\n```", inline=False)
+
+        await ctx.send(embed=embed)
+
     @commands.command(name='statistics_visualization')
     async def statistics_visualization(self, ctx, *, member: discord.Member = None):
         if member is None:
             member = ctx.author
-        stats = self.bot.get_cog('ActivityTracker').get_statistics(str(member.id))
-        if stats:
+        comparison = await self.bot.get_cog('ActivityTracker').aio.get_server_comparison(str(member.id))
+        if comparison:
             # Generate the visualization
-            visualization_path = generate_statistics_visualization(stats)
+            try:
+                image = await render_pool.render('statistics', comparison=comparison)
+            except RenderError as e:
+                await ctx.send(f"Couldn't draw your statistics: {e}")
+                return
             embed = discord.Embed(title="Statistics Visualization", color=discord.Color.purple())
-            file = discord.File(visualization_path, filename="statistics_visualization.png")
+            file = image_file(image, "statistics_visualization.png")
             embed.set_image(url=f"attachment://statistics_visualization.png")
             await member.send(embed=embed, file=file)
         else:
@@ -528,12 +535,13 @@ class LevelUI(commands.Cog):
 
         if mugged and spin_result == "🔴":
             user_id = str(target.id)
-            plr_id = str(ctx.author.id)
-            coins = ActivityTracker.get_coins(user_id)
+            coins = await ActivityTracker.aio.get_coins(user_id)
             loss = random.randint(1, coins)  # Limit loss to available coins or 10,000
 
-            ActivityTracker.update_coins(user_id, -loss)
-            ActivityTracker.update_coins(plr_id, loss)
+            success, _ = await ActivityTracker.aio.transfer_coins(target, ctx.author, loss, ledger.MUGGING, '!flipoff')
+            if not success:
+                await ctx.send(f"{target.mention}, your pockets were empty by the time the mugger got to you!")
+                return
             await ctx.send(f"Oh no! {target.mention}, you got mugged and lost {loss} coins! Better luck next time!")
             await asyncio.sleep(2)
             await ctx.send(f"{ctx.author.id}, you stole {loss} of {target.mention}'s coins!")
@@ -0,0 +1,176 @@
+# database.py
+import asyncio
+import concurrent.futures
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+DATABASE = 'data/databases/users.db'
+
+# Pragmas applied to every connection when it is opened.
+# WAL lets readers run while a write is in progress, NORMAL sync is safe under WAL,
+# and a negative cache_size is in KiB (roughly 16 MB of page cache per connection).
+PRAGMAS = (
+    'PRAGMA journal_mode = WAL',
+    'PRAGMA synchronous = NORMAL',
+    'PRAGMA cache_size = -16000',
+    'PRAGMA temp_store = MEMORY',
+    'PRAGMA foreign_keys = ON',
+    'PRAGMA busy_timeout = 5000',
+)
+
+# Number of compiled statements sqlite3 keeps per connection.
+# Every query in the bot is a fixed string, so they all stay prepared after first use.
+STATEMENT_CACHE_SIZE = 256
+
+
+class Database:
+    """Long-lived SQLite connections, one per thread, shared by every cog.
+
+    Connections are opened lazily the first time a thread touches the database and
+    are kept until close() is called. Outside of a transaction() block every statement
+    commits on its own; inside one, everything commits (or rolls back) together.
+    """
+
+    def __init__(self, path=DATABASE):
+        self.path = path
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+
+    def connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # isolation_level=None puts the driver in autocommit mode so that
+            # transaction boundaries are only ever the ones opened by transaction().
+            conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False,
+                                   cached_statements=STATEMENT_CACHE_SIZE)
+            for pragma in PRAGMAS:
+                conn.execute(pragma)
+            self._local.conn = conn
+            self._local.depth = 0
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        """Group several statements into a single commit.
+
+        Nested blocks join the outermost transaction, so helpers that open their own
+        transaction can be called from inside a larger one.
+        """
+        conn = self.connection()
+        if self._local.depth == 0:
+            conn.execute('BEGIN IMMEDIATE')
+            self._local.on_commit = []
+        self._local.depth += 1
+        try:
+            yield conn
+        except BaseException:
+            self._local.depth -= 1
+            if self._local.depth == 0:
+                self._local.on_commit = []
+                conn.execute('ROLLBACK')
+            raise
+        else:
+            self._local.depth -= 1
+            if self._local.depth == 0:
+                conn.execute('COMMIT')
+                callbacks, self._local.on_commit = self._local.on_commit, []
+                for callback in callbacks:
+                    callback()
+
+    def on_commit(self, callback):
+        """Run callback once the current transaction commits, or right away if there is none.
+
+        In-memory state that mirrors the database (caches, leaderboards, ...) is updated
+        this way so a rolled back transaction never leaves it ahead of the tables.
+        """
+        self.connection()
+        if self._local.depth:
+            self._local.on_commit.append(callback)
+        else:
+            callback()
+
+    def execute(self, query, params=()):
+        return self.connection().execute(query, params)
+
+    def executemany(self, query, seq_of_params):
+        return self.connection().executemany(query, seq_of_params)
+
+    def fetchall(self, query, params=()):
+        return self.connection().execute(query, params).fetchall()
+
+    def fetchone(self, query, params=()):
+        return self.connection().execute(query, params).fetchone()
+
+    def close(self):
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.ProgrammingError:
+                # Already closed by the thread that owned it
+                pass
+        self._local = threading.local()
+
+
+class DatabaseWorker:
+    """A single thread that runs database jobs in the order they were queued.
+
+    Coroutines await run() instead of calling blocking sqlite code directly, so the
+    event loop keeps serving heartbeats and commands while queries execute.
+    """
+
+    def __init__(self, name='database-worker'):
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                break
+            future, fn, args, kwargs = job
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(fn(*args, **kwargs))
+            except BaseException as e:
+                future.set_exception(e)
+
+    def submit(self, fn, *args, **kwargs):
+        future = concurrent.futures.Future()
+        self._queue.put((future, fn, args, kwargs))
+        return future
+
+    async def run(self, fn, *args, **kwargs):
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    def stop(self):
+        # Jobs queued before stop() still run; the sentinel ends the loop after them
+        self._queue.put(None)
+        self._thread.join()
+
+
+class AsyncProxy:
+    """Awaitable mirror of an object: proxy.method(...) runs target.method(...) on the worker."""
+
+    def __init__(self, target, worker):
+        self._target = target
+        self._worker = worker
+
+    def __getattr__(self, name):
+        method = getattr(self._target, name)
+        if not callable(method):
+            raise AttributeError(f"{name} is not a method and has no async equivalent")
+
+        async def call(*args, **kwargs):
+            return await self._worker.run(method, *args, **kwargs)
+
+        call.__name__ = name
+        return call
@@ -1,7 +1,9 @@
 import random, os, discord, asyncio, json
-from PIL import Image
 from discord.ext import commands
 from settings.settings import load_settings
+from bot import ledger
+from utils.image_files import image_file
+from utils import cards
 
 with open('settings/json/game_settings.json', 'r') as f:
     game_settings = json.load(f)
@@ -12,8 +14,6 @@ coin_icon = settings['coin_icon']
 CARD_VALUES = game_settings['blackjack']['card_values']  # Dictionary of card values
 SUITS = game_settings['blackjack']['suits']  # List of suits
 DECK = [f'{value}_of_{suit}' for suit in SUITS for value in CARD_VALUES.keys()]  # List of all cards in the deck
-DECK_IMAGES_FOLDER = 'utils/images/deckofcards'
-DUMP_IMAGES_FOLDER = 'utils/images/blackjackdump'
 
 BLACKJACK_WIN_POINTS = 100
 BLACKJACK_LOSS_POINTS = 20
@@ -86,37 +86,11 @@ class BlackjackGame:
             return "lose"
 
     async def create_hand_image(self, hand, reveal_dealer=False):
-        card_images = []
-        for card in hand:
-            if isinstance(card, dict) and card.get('value') == 'back':
-                card_image_path = os.path.join(DECK_IMAGES_FOLDER, 'back.png')
-            else:
-                card_value = card[:-1]  # Extract the value part of the card string
-                card_suit = card[-1].upper()  # Extract the suit part of the card string
-                if card_value == '10':  # Check for '10' separately
-                    card_image_path = os.path.join(DECK_IMAGES_FOLDER, '10', f'10{card_suit}.png')
-                else:
-                    card_value = card_value[0].upper()
-                    card_image_path = os.path.join(DECK_IMAGES_FOLDER, card_value, f'{card_value}{card_suit}.png')
-            card_images.append(card_image_path)
-        return card_images
-
-    async def concatenate_images(self, image_paths, filename):
-        images = [Image.open(path) for path in image_paths]
-        widths, heights = zip(*(img.size for img in images))
-        total_width = sum(widths)
-        max_height = max(heights)
-        new_image = Image.new('RGB', (total_width, max_height))
-
-        x_offset = 0
-        for img in images:
-            new_image.paste(img, (x_offset, 0))
-            x_offset += img.size[0]
-
-        output_path = os.path.join(DUMP_IMAGES_FOLDER, filename)
-        new_image.save(output_path)
-
-        return output_path
+        # Card ids for the hand; the dealer's hidden card is a {'value': 'back'} placeholder
+        return [cards.BACK if isinstance(card, dict) and card.get('value') == 'back' else cards.card_id(card) for card in hand]
+
+    async def concatenate_images(self, card_ids):
+        return cards.hand_image(card_ids)
 
     async def hit(self, ctx):
         card = await self.player_hit()
@@ -136,21 +110,20 @@ class BlackjackGame:
         ActivityTracker = self.bot.get_cog('ActivityTracker')
         if result == "win":
             payout = self.bet * 2
-            ActivityTracker.update_coins(ctx.author.id, payout)
-            ActivityTracker.update_points(ctx.author.id, BLACKJACK_WIN_POINTS)
+            await ActivityTracker.aio.update_coins(ctx.author.id, payout, ledger.PAYOUT, 'blackjack')
+            await ActivityTracker.aio.update_points(ctx.author.id, BLACKJACK_WIN_POINTS)
             await ctx.send(f"Congratulations {ctx.author.mention}, you win! You have been awarded {BLACKJACK_WIN_POINTS} points and {payout} {coin_icon}.")
         elif result == "bust":
-            ActivityTracker.update_points(ctx.author.id, BLACKJACK_LOSS_POINTS)
+            await ActivityTracker.aio.update_points(ctx.author.id, BLACKJACK_LOSS_POINTS)
             await ctx.send(f"Sorry {ctx.author.mention}, you busted! You lost {self.bet} {coin_icon}.")
         elif result == "lose":
-            ActivityTracker.update_points(ctx.author.id, BLACKJACK_LOSS_POINTS)
+            await ActivityTracker.aio.update_points(ctx.author.id, BLACKJACK_LOSS_POINTS)
             await ctx.send(f"Sorry {ctx.author.mention}, you lose! You lost {self.bet} {coin_icon}.")
         elif result == "push":
-            ActivityTracker.update_coins(ctx.author.id, self.bet)
-            ActivityTracker.update_points(ctx.author.id, BLACKJACK_PUSH_POINTS)
+            await ActivityTracker.aio.update_coins(ctx.author.id, self.bet, ledger.REFUND, 'blackjack')
+            await ActivityTracker.aio.update_points(ctx.author.id, BLACKJACK_PUSH_POINTS)
             await ctx.send(f"It's a push, {ctx.author.mention}. Your bet of {self.bet} {coin_icon} has been returned.")
 
-        await self.cleanup_images()
         del self.bot.get_cog('GameManager').blackjack_games[ctx.author.id]
 
     async def send_hand(self, ctx, reveal_dealer=False):
@@ -158,11 +131,11 @@ class BlackjackGame:
         dealer_hand = self.dealer_hand if reveal_dealer else self.dealer_hand[:1] + [{'value': 'back', 'suit': ''}]
         dealer_images = await self.create_hand_image(dealer_hand)
 
-        concatenated_player_image = await self.concatenate_images(player_images, f'blackjack_{ctx.author.id}_player_hand.png')
-        concatenated_dealer_image = await self.concatenate_images(dealer_images, f'blackjack_{ctx.author.id}_dealer_hand.png')
+        concatenated_player_image = await self.concatenate_images(player_images)
+        concatenated_dealer_image = await self.concatenate_images(dealer_images)
 
-        player_hand_embed = discord.File(concatenated_player_image, filename="player_hand.png")
-        dealer_hand_embed = discord.File(concatenated_dealer_image, filename="dealer_hand.png")
+        player_hand_embed = image_file(concatenated_player_image, "player_hand.png")
+        dealer_hand_embed = image_file(concatenated_dealer_image, "dealer_hand.png")
 
         embed = discord.Embed(title="Blackjack")
         embed.add_field(name="Your Hand", value=f"Points: {self.player_points}", inline=True)
@@ -172,8 +145,3 @@ class BlackjackGame:
 
         await ctx.send(embed=embed, files=[player_hand_embed, dealer_hand_embed])
 
-    async def cleanup_images(self):
-        for filename in os.listdir(DUMP_IMAGES_FOLDER):
-            file_path = os.path.join(DUMP_IMAGES_FOLDER, filename)
-            if os.path.isfile(file_path):
-                os.unlink(file_path)
\ No newline at end of file
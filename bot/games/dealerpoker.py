@@ -1,7 +1,9 @@
 import discord, random, os, asyncio, json, asyncio, itertools
 from discord.ext import commands
-from PIL import Image, ImageDraw, ImageFont
 from settings.settings import load_settings
+from bot import ledger
+from utils.image_files import image_file
+from utils import cards
 
 with open('settings/json/game_settings.json', 'r') as f:
     game_settings = json.load(f)
@@ -23,8 +25,6 @@ class DealerPoker:
         self.dealer_hand = []
         self.player_hands = {}
         self.community_cards = []
-        self.DECK_OF_CARDS_FOLDER = 'utils/images/deckofcards'
-        self.DUMP_IMAGES_FOLDER = 'utils/images/pokerdump'
         self.previous_community_cards_message = None
         self.game_cancelled = False
         self.raised = False
@@ -70,15 +70,12 @@ class DealerPoker:
             return
 
         await self.showdown()
-        if self.game_cancelled:
-            return
-
-        await self.cleanup()
 
     async def ask_for_ante(self):
         ActivityTracker = self.bot.get_cog('ActivityTracker')
         user_id = self.player.id
-        await self.ctx.send(f"{self.ctx.author.mention}, how many {coin_icon} would you like to ante?  Current balance: {int(ActivityTracker.get_coins(user_id))} {coin_icon}")
+        current_balance = await ActivityTracker.aio.get_coins(user_id)
+        await self.ctx.send(f"{self.ctx.author.mention}, how many {coin_icon} would you like to ante?  Current balance: {int(current_balance)} {coin_icon}")
 
         def check(m):
             return m.author == self.ctx.author and m.channel == self.ctx.channel
@@ -87,14 +84,12 @@ class DealerPoker:
             msg = await self.bot.wait_for('message', check=check, timeout=120)
             self.ante = int(msg.content)
             ActivityTracker = self.bot.get_cog('ActivityTracker')
-            player_coins = ActivityTracker.get_coins(user_id)
 
-            if player_coins < self.ante:
+            if await ActivityTracker.aio.debit_coins(user_id, self.ante, ledger.BET, 'dealerpoker') is None:
                 await self.ctx.send(f"{self.ctx.author.mention}, you do not have enough {coin_icon} to ante that amount.")
                 self.game_cancelled = True
                 return
             
-            ActivityTracker.update_coins(user_id, -(self.ante))
             self.player_bet = self.ante
             self.player_hands[self.ctx.author] = []
             await self.ctx.send(f"{self.ctx.author.mention}, you have anted {self.ante} {coin_icon}.  Starting Dealer Poker..")
@@ -118,7 +113,7 @@ class DealerPoker:
     async def betting_round(self, stage='pre_flop'):
         ActivityTracker = self.bot.get_cog('ActivityTracker')
         user_id = self.player.id
-        player_total_coins = int(ActivityTracker.get_coins(user_id))
+        player_total_coins = int(await ActivityTracker.aio.get_coins(user_id))
 
         # Determine the max bet based on the game stage
         if stage == 'pre_flop':
@@ -185,11 +180,12 @@ class DealerPoker:
                         elif additional_amount > player_total_coins:
                             rsp_msg = await self.ctx.send(f"{self.ctx.author.mention}, you do not have enough balance to place this bet.")
                             self.bot_messages.append(rsp_msg)
+                        elif (new_balance := await ActivityTracker.aio.debit_coins(user_id, additional_amount, ledger.BET, 'dealerpoker')) is None:
+                            rsp_msg = await self.ctx.send(f"{self.ctx.author.mention}, you do not have enough balance to place this bet.")
+                            self.bot_messages.append(rsp_msg)
                         else:
                             self.player_bet = bet_amount  # Update player's total bet to include the new bet amount
-                            player_total_coins -= additional_amount
-                            ActivityTracker = self.bot.get_cog('ActivityTracker')
-                            ActivityTracker.update_coins(user_id, -(additional_amount))
+                            player_total_coins = new_balance
                             rsp_msg = await self.ctx.send(f"{self.ctx.author.mention} places a bet of {additional_amount} {coin_icon}. Total bet: {self.player_bet} {coin_icon}. Current balance: {player_total_coins} {coin_icon}.")
                             self.bot_messages.append(rsp_msg)
                             self.raised = True
@@ -201,9 +197,9 @@ class DealerPoker:
                 elif content[0] == '!allin' and stage == 'river' and (additional_amount > player_total_coins):
                     if additional_amount > player_total_coins:
                         # Going all-in
+                        player_total_coins = await ActivityTracker.aio.debit_all_coins(user_id, ledger.BET, 'dealerpoker')
                         additional_amount = player_total_coins
                         self.player_bet += player_total_coins
-                        ActivityTracker.update_coins(user_id, -(player_total_coins))
                         rsp_msg = await self.ctx.send(f"{self.ctx.author.mention} goes all-in with {player_total_coins} {coin_icon}. Total bet: {self.player_bet} {coin_icon}.")
                         self.bot_messages.append(rsp_msg)
                         self.raised = True
@@ -240,9 +236,8 @@ class DealerPoker:
         await asyncio.sleep(1)
 
         # Create and send Player's Hand embed
-        player_hand_images = [await self.get_card_image(card) for card in player_hand]
-        player_hand_image_path = await self.concatenate_images(player_hand_images, 'player_hand.png')
-        player_hand_file = discord.File(player_hand_image_path, filename="player_hand.png")
+        player_hand_image = await self.concatenate_images(player_hand)
+        player_hand_file = image_file(player_hand_image, "player_hand.png")
         player_embed = discord.Embed(title="Player's Hand")
         player_embed.set_image(url="attachment://player_hand.png")
         await self.ctx.send(file=player_hand_file, embed=player_embed)
@@ -250,9 +245,8 @@ class DealerPoker:
         await asyncio.sleep(2)
 
         # Create and send Community Cards embed
-        community_cards_images = [await self.get_card_image(card) for card in self.community_cards]
-        community_cards_image_path = await self.concatenate_images(community_cards_images, 'community_cards.png')
-        community_cards_file = discord.File(community_cards_image_path, filename="community_cards.png")
+        community_cards_image = await self.concatenate_images(self.community_cards)
+        community_cards_file = image_file(community_cards_image, "community_cards.png")
         community_embed = discord.Embed(title="Community Cards")
         community_embed.set_image(url="attachment://community_cards.png")
         await self.ctx.send(file=community_cards_file, embed=community_embed)
@@ -260,9 +254,8 @@ class DealerPoker:
         await asyncio.sleep(2)
 
         # Create and send Dealer's Hand embed
-        dealer_hand_images = [await self.get_card_image(card) for card in dealer_hand]
-        dealer_hand_image_path = await self.concatenate_images(dealer_hand_images, 'dealer_hand.png')
-        dealer_hand_file = discord.File(dealer_hand_image_path, filename="dealer_hand.png")
+        dealer_hand_image = await self.concatenate_images(dealer_hand)
+        dealer_hand_file = image_file(dealer_hand_image, "dealer_hand.png")
         dealer_embed = discord.Embed(title="Dealer's Hand")
         dealer_embed.set_image(url="attachment://dealer_hand.png")
         await self.ctx.send(file=dealer_hand_file, embed=dealer_embed)
@@ -274,11 +267,6 @@ class DealerPoker:
 
         await self.clear_messages()
 
-        # Clean up images
-        os.remove(player_hand_image_path)
-        os.remove(community_cards_image_path)
-        os.remove(dealer_hand_image_path)
-
     async def reveal_community_cards(self, num):
         for _ in range(num):
             self.deck.pop()  # Burn card
@@ -299,9 +287,8 @@ class DealerPoker:
         
         await message.delete()
 
-        cards = [await self.get_card_image(card) for card in self.community_cards]
-        concatenated_image_path = await self.concatenate_images(cards, 'community_cards.png')
-        file = discord.File(concatenated_image_path, filename="community_cards.png")
+        concatenated_image = await self.concatenate_images(self.community_cards)
+        file = image_file(concatenated_image, "community_cards.png")
 
         embed = discord.Embed(title="Community Cards")
         embed.set_image(url="attachment://community_cards.png")
@@ -333,27 +320,25 @@ class DealerPoker:
         if player_rank > dealer_rank:
             result = f"{self.ctx.author.mention} wins with a {self.rank_description(player_rank)} and has won {POKER_WIN_POINTS} points and {self.player_bet * 2} {coin_icon}!"
             payout = self.player_bet * 2
-            ActivityTracker.update_coins(user_id, payout)
-            ActivityTracker.update_points(user_id, POKER_WIN_POINTS)
+            await ActivityTracker.aio.update_coins(user_id, payout, ledger.PAYOUT, 'dealerpoker')
+            await ActivityTracker.aio.update_points(user_id, POKER_WIN_POINTS)
         elif player_rank < dealer_rank:
             result = f"The dealer wins with a {self.rank_description(dealer_rank)}. Better luck next time! You have received {POKER_LOSS_POINTS} points."
             payout = 0
-            ActivityTracker.update_coins(user_id, payout)
-            ActivityTracker.update_points(user_id, POKER_LOSS_POINTS)
+            await ActivityTracker.aio.update_points(user_id, POKER_LOSS_POINTS)
         else:
             result = f"It's a tie! Both you and the dealer have the same hand. You have received {POKER_TIE_POINTS} points, and your ante of {self.ante} {coin_icon} has been returned."
             payout = self.player_bet  # Usually, in a tie, the player gets their ante back or a portion of it
-            ActivityTracker.update_coins(user_id, payout)
-            ActivityTracker.update_points(user_id, POKER_TIE_POINTS)
+            await ActivityTracker.aio.update_coins(user_id, payout, ledger.REFUND, 'dealerpoker')
+            await ActivityTracker.aio.update_points(user_id, POKER_TIE_POINTS)
 
         await asyncio.sleep(1)
         await self.ctx.send(f"**SHOWDOWN**")
         await asyncio.sleep(1)
 
         # Create and send Player's Hand embed
-        player_hand_images = [await self.get_card_image(card) for card in player_hand]
-        player_hand_image_path = await self.concatenate_images(player_hand_images, 'player_hand.png')
-        player_hand_file = discord.File(player_hand_image_path, filename="player_hand.png")
+        player_hand_image = await self.concatenate_images(player_hand)
+        player_hand_file = image_file(player_hand_image, "player_hand.png")
         player_embed = discord.Embed(title="Player's Hand")
         player_embed.set_image(url="attachment://player_hand.png")
         await self.ctx.send(file=player_hand_file, embed=player_embed)
@@ -361,9 +346,8 @@ class DealerPoker:
         await asyncio.sleep(2)
 
         # Create and send Community Cards embed
-        community_cards_images = [await self.get_card_image(card) for card in self.community_cards]
-        community_cards_image_path = await self.concatenate_images(community_cards_images, 'community_cards.png')
-        community_cards_file = discord.File(community_cards_image_path, filename="community_cards.png")
+        community_cards_image = await self.concatenate_images(self.community_cards)
+        community_cards_file = image_file(community_cards_image, "community_cards.png")
         community_embed = discord.Embed(title="Community Cards")
         community_embed.set_image(url="attachment://community_cards.png")
         await self.ctx.send(file=community_cards_file, embed=community_embed)
@@ -371,9 +355,8 @@ class DealerPoker:
         await asyncio.sleep(2)
 
         # Create and send Dealer's Hand embed
-        dealer_hand_images = [await self.get_card_image(card) for card in dealer_hand]
-        dealer_hand_image_path = await self.concatenate_images(dealer_hand_images, 'dealer_hand.png')
-        dealer_hand_file = discord.File(dealer_hand_image_path, filename="dealer_hand.png")
+        dealer_hand_image = await self.concatenate_images(dealer_hand)
+        dealer_hand_file = image_file(dealer_hand_image, "dealer_hand.png")
         dealer_embed = discord.Embed(title="Dealer's Hand")
         dealer_embed.set_image(url="attachment://dealer_hand.png")
         await self.ctx.send(file=dealer_hand_file, embed=dealer_embed)
@@ -385,22 +368,15 @@ class DealerPoker:
 
         await self.clear_messages()
 
-        # Clean up images
-        os.remove(player_hand_image_path)
-        os.remove(community_cards_image_path)
-        os.remove(dealer_hand_image_path)
-
     async def display_final_hands(self, player_hand, dealer_hand):
-        player_hand_images = [await self.get_card_image(card) for card in player_hand]
-        dealer_hand_images = [await self.get_card_image(card) for card in dealer_hand]
 
-        player_hand_image = await self.concatenate_images(player_hand_images, 'player_final_hand.png')
-        dealer_hand_image = await self.concatenate_images(dealer_hand_images, 'dealer_final_hand.png')
+        player_hand_image = await self.concatenate_images(player_hand)
+        dealer_hand_image = await self.concatenate_images(dealer_hand)
 
         embed = discord.Embed(title="Final Hands")
         embed.set_image(url="attachment://player_final_hand.png")
-        player_file = discord.File(player_hand_image, filename="player_final_hand.png")
-        dealer_file = discord.File(dealer_hand_image, filename="dealer_final_hand.png")
+        player_file = image_file(player_hand_image, "player_final_hand.png")
+        dealer_file = image_file(dealer_hand_image, "dealer_final_hand.png")
 
         msg = await self.ctx.send(file=player_file, embed=embed)
 
@@ -425,15 +401,13 @@ class DealerPoker:
         return descriptions[rank[0]]
 
     async def get_hand_image(self, hand):
-        cards = [await self.get_card_image(card) for card in hand]
-        concatenated_image_path = await self.concatenate_images(cards, 'showdown_hand.png')
-        return concatenated_image_path
+        concatenated_image = await self.concatenate_images(hand)
+        return concatenated_image
 
     async def send_hand(self, ctx, player, reveal=False, dealer=False):
         hand = self.player_hands[player] if not dealer else self.dealer_hand
-        card_images = [await self.get_card_image(card) for card in hand]
-        concatenated_image_path = await self.concatenate_images(card_images, f'poker_{player.id}_hand.png')
-        file = discord.File(concatenated_image_path, filename="hand.png")
+        concatenated_image = await self.concatenate_images(hand)
+        file = image_file(concatenated_image, "hand.png")
 
         title = f"{player.display_name}'s Hand" if not dealer else "Dealer's Hand"
         embed = discord.Embed(title=title)
@@ -442,42 +416,8 @@ class DealerPoker:
 
         self.bot_messages.append(initial)
 
-    async def get_card_image(self, card):
-        card_value = card[:-1]
-        card_suit = card[-1].upper()
-        if card_value == '10':
-            card_image_path = os.path.join(self.DECK_OF_CARDS_FOLDER, '10', f'10{card_suit}.png')
-        else:
-            card_value = card_value[0].upper()
-            card_image_path = os.path.join(self.DECK_OF_CARDS_FOLDER, card_value, f'{card_value}{card_suit}.png')
-        return card_image_path
-
-    async def concatenate_images(self, image_paths, filename, vertical=False):
-        images = [Image.open(path) for path in image_paths]
-        widths, heights = zip(*(img.size for img in images))
-        
-        if vertical:
-            total_width = max(widths)
-            total_height = sum(heights)
-        else:
-            total_width = sum(widths)
-            total_height = max(heights)
-
-        new_image = Image.new('RGB', (total_width, total_height))
-
-        x_offset, y_offset = 0, 0
-        for img in images:
-            if vertical:
-                new_image.paste(img, (0, y_offset))
-                y_offset += img.size[1]
-            else:
-                new_image.paste(img, (x_offset, 0))
-                x_offset += img.size[0]
-
-        output_path = os.path.join(self.DUMP_IMAGES_FOLDER, filename)
-        new_image.save(output_path)
-
-        return output_path
+    async def concatenate_images(self, hand, vertical=False):
+        return cards.hand_image([cards.card_id(card) for card in hand], vertical)
 
     def hand_rank(self, hand):
         # Define ranks and handle '10' separately using 'T'
@@ -531,9 +471,8 @@ class DealerPoker:
         return best_hand
 
     async def reveal_hand(self, player, hand, dealer=False):
-        cards = [await self.get_card_image(card) for card in hand]
-        concatenated_image_path = await self.concatenate_images(cards, f'poker_{player.id}_hand.png')
-        file = discord.File(concatenated_image_path, filename="hand.png")
+        concatenated_image = await self.concatenate_images(hand)
+        file = image_file(concatenated_image, "hand.png")
 
         title = f"{player.display_name}'s Hand" if not dealer else "Dealer's Hand"
         embed = discord.Embed(title=title)
@@ -541,36 +480,31 @@ class DealerPoker:
         msg = await self.ctx.send(file=file, embed=embed)
 
         # Dramatic reveal of each card
-        for i, card in enumerate(cards):
+        for i, card in enumerate(hand):
             await asyncio.sleep(1)  # Adding delay for dramatic effect
-            if i < len(cards) - 1:
+            if i < len(hand) - 1:
                 await msg.edit(content=f"{player.display_name} reveals {card}.")
             else:
                 await self.ctx.send(f"{player.display_name} reveals {card}.")
 
     async def create_final_showdown_image(self, player_hand, dealer_hand):
-        # Get image paths for each hand and community cards
-        player_hand_images = [await self.get_card_image(card) for card in player_hand]
-        dealer_hand_images = [await self.get_card_image(card) for card in dealer_hand]
-        community_cards_images = [await self.get_card_image(card) for card in self.community_cards]
-
         # Create and send Player's Hand embed
-        player_hand_image_path = await self.concatenate_images(player_hand_images, 'player_hand.png')
-        player_hand_file = discord.File(player_hand_image_path, filename="player_hand.png")
+        player_hand_image = await self.concatenate_images(player_hand)
+        player_hand_file = image_file(player_hand_image, "player_hand.png")
         player_embed = discord.Embed(title="Player's Hand")
         player_embed.set_image(url="attachment://player_hand.png")
         await self.ctx.send(file=player_hand_file, embed=player_embed)
 
         # Create and send Community Cards embed
-        community_cards_image_path = await self.concatenate_images(community_cards_images, 'community_cards.png')
-        community_cards_file = discord.File(community_cards_image_path, filename="community_cards.png")
+        community_cards_image = await self.concatenate_images(self.community_cards)
+        community_cards_file = image_file(community_cards_image, "community_cards.png")
         community_embed = discord.Embed(title="Community Cards")
         community_embed.set_image(url="attachment://community_cards.png")
         await self.ctx.send(file=community_cards_file, embed=community_embed)
 
         # Create and send Dealer's Hand embed
-        dealer_hand_image_path = await self.concatenate_images(dealer_hand_images, 'dealer_hand.png')
-        dealer_hand_file = discord.File(dealer_hand_image_path, filename="dealer_hand.png")
+        dealer_hand_image = await self.concatenate_images(dealer_hand)
+        dealer_hand_file = image_file(dealer_hand_image, "dealer_hand.png")
         dealer_embed = discord.Embed(title="Dealer's Hand")
         dealer_embed.set_image(url="attachment://dealer_hand.png")
         await self.ctx.send(file=dealer_hand_file, embed=dealer_embed)
@@ -590,27 +524,3 @@ class DealerPoker:
 
         # Send the result message
         await self.ctx.send(result)
-
-        # Clean up images
-        os.remove(player_hand_image_path)
-        os.remove(community_cards_image_path)
-        os.remove(dealer_hand_image_path)
-
-
-    async def cleanup(self):
-        """Clean up temporary images and reset state if needed."""
-        for filename in os.listdir(self.DUMP_IMAGES_FOLDER):
-            file_path = os.path.join(self.DUMP_IMAGES_FOLDER, filename)
-            try:
-                if os.path.isfile(file_path):
-                    os.unlink(file_path)
-            except Exception as e:
-                print(f"Failed to delete {file_path}. Reason: {e}")
-
-    def cleanup_image(self, image_path):
-        """Remove the image file after it's used."""
-        try:
-            os.remove(image_path)
-        except Exception as e:
-            print(f"Error deleting image {image_path}: {e}")
-
@@ -1,5 +1,6 @@
 import random, aiohttp, discord, json
 from settings.settings import load_settings
+from bot import ledger
 from discord.ext import commands
 
 # Load game settings from a JSON file
@@ -87,8 +88,9 @@ class Duel:
                 winner = self.bot.get_user(winner_id)
                 await ctx.send(f"{winner.mention} wins the duel!")
                 activity_tracker = self.bot.get_cog('ActivityTracker')
-                activity_tracker.update_user_activity(winner, points=DUEL_WIN_POINTS, coins=DUEL_WIN_COINS)
-                await ctx.send(f"{winner.mention} has been awarded {DUEL_WIN_POINTS} points and {DUEL_WIN_COINS} {coin_icon}! Total {coin_icon}: {activity_tracker.activity_data[str(winner.id)]['coins']}")
+                await activity_tracker.aio.update_user_activity(winner, points=DUEL_WIN_POINTS, coins=DUEL_WIN_COINS, reason=ledger.PAYOUT, source='duel')
+                total_coins = await activity_tracker.aio.get_coins(str(winner.id))
+                await ctx.send(f"{winner.mention} has been awarded {DUEL_WIN_POINTS} points and {DUEL_WIN_COINS} {coin_icon}! Total {coin_icon}: {total_coins}")
                 
                 del self.duels[duel.player1]
                 del self.duels[duel.player2]
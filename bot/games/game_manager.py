@@ -8,6 +8,7 @@ from .dealerpoker import DealerPoker
 from .gifthunt import GiftHunt
 from .slots import SlotMachine
 from settings.settings import load_settings
+from bot import ledger
 
 logging.basicConfig(level=logging.INFO)
 
@@ -60,10 +61,11 @@ class GameManager(commands.Cog):
 
     async def CoinsAreOut(self, ctx, user_id):
         ActivityTracker = self.bot.get_cog('ActivityTracker')
-        if ActivityTracker.get_coins(user_id) == 0:
+        coins = await ActivityTracker.aio.get_coins(user_id)
+        if coins == 0:
             await ctx.send(f"You are out of coins.  Get a job or don't gamble.")
             return True
-        elif ActivityTracker.get_coins(user_id) < 0:
+        elif coins < 0:
             print("ERROR: Under 0?")
             return True
         else:
@@ -94,7 +96,7 @@ class GameManager(commands.Cog):
         
         ActivityTracker = self.bot.get_cog('ActivityTracker')
         user_id = str(ctx.author.id)
-        current_coins = ActivityTracker.get_coins(user_id)
+        current_coins = await ActivityTracker.aio.get_coins(user_id)
 
         await ctx.send(f"You have {current_coins} {coin_icon}. How many {coin_icon} would you like to bet?")
 
@@ -115,8 +117,9 @@ class GameManager(commands.Cog):
                 await ctx.send("You took too long to respond! Please use !blackjack again.")
                 return
 
-        reduction_amt = -(bet)
-        ActivityTracker.update_coins(ctx.author.id, reduction_amt)
+        if await ActivityTracker.aio.debit_coins(ctx.author.id, bet, ledger.BET, 'blackjack') is None:
+            await ctx.send(f"You no longer have enough {coin_icon} to cover that bet.")
+            return
 
         game = BlackjackGame(ctx.author, self.bot)
         await game.start_game(bet)
@@ -157,18 +160,18 @@ class GameManager(commands.Cog):
             msg = await self.bot.wait_for('message', check=check, timeout=50.0)
             if msg.content.lower() == '!accept':
                 ActivityTracker = self.bot.get_cog('ActivityTracker')
-                user_balance = ActivityTracker.get_coins(user_id)
+                new_balance = await ActivityTracker.aio.debit_coins(user_id, cost, ledger.LOTTERY_TICKET, 'lottery')
 
-                if user_balance < cost:
+                if new_balance is None:
+                    user_balance = await ActivityTracker.aio.get_coins(user_id)
                     await ctx.send(f"{ctx.author.mention}, you do not have enough {coin_icon} to buy {num_tickets} tickets. Your current balance is {user_balance} {coin_icon}.")
                     return
 
-                ActivityTracker.update_coins(ctx.author.id, -(cost))
                 self.lottery.add_tickets(user_id, num_tickets)
                 total_tickets = self.lottery.load_lottery_data()['participants'][user_id]
 
                 current_lottery_pot = self.lottery.get_current_lottery_pot()
-                await ctx.send(f"Purchase Successful. Check back at 11 PM EST for the lottery results. You now have a total of {total_tickets} tickets in the lottery. \nYour {coin_icon} Balance: {user_balance - cost} {coin_icon}, Current Lottery Pot: {current_lottery_pot} {coin_icon}")
+                await ctx.send(f"Purchase Successful. Check back at 11 PM EST for the lottery results. You now have a total of {total_tickets} tickets in the lottery. \nYour {coin_icon} Balance: {new_balance} {coin_icon}, Current Lottery Pot: {current_lottery_pot} {coin_icon}")
             else:
                 await ctx.send("Purchase cancelled")
         except ValueError:
@@ -4,6 +4,7 @@ import json
 import asyncio
 import random
 from settings.settings import load_settings
+from bot import ledger
 
 with open('settings/json/game_settings.json', 'r') as f:
     game_settings = json.load(f)
@@ -49,7 +50,8 @@ class GiftHunt:
         ActivityTracker =self.bot.get_cog('ActivityTracker')
         user_id = self.player.id
         
-        await self.ctx.send(f"{self.ctx.author.mention}, how many {coin_icon} would you like to ante?  Current balance: {int(ActivityTracker.get_coins(user_id))} {coin_icon}")
+        current_balance = await ActivityTracker.aio.get_coins(user_id)
+        await self.ctx.send(f"{self.ctx.author.mention}, how many {coin_icon} would you like to ante?  Current balance: {int(current_balance)} {coin_icon}")
 
         def check(m):
             return m.author == self.player and m.channel == self.ctx.channel
@@ -58,14 +60,12 @@ class GiftHunt:
             msg = await self.bot.wait_for('message', check=check, timeout=120)
             self.bet = int(msg.content)
             ActivityTracker = self.bot.get_cog('ActivityTracker')
-            player_coins = ActivityTracker.get_coins(user_id)
 
-            if player_coins < self.bet:
+            if await ActivityTracker.aio.debit_coins(user_id, self.bet, ledger.BET, 'gifthunt') is None:
                 await self.ctx.send(f"{self.player.mention}, you do not have enough {coin_icon} to ante that amount.")
                 self.game_cancelled = True
                 return
             
-            ActivityTracker.update_coins(user_id, -(self.bet))
             await self.ctx.send(f"{self.player.mention}, you have anted {self.bet} {coin_icon}.  Starting Gift Hunt..")
         except asyncio.TimeoutError:
             await self.ctx.send(f"{self.player.mention} took too long to respond.  Game has been cancelled without refund.")
@@ -171,11 +171,11 @@ class GiftHunt:
             if final_gift == self.winning_gift:
                 await self.ctx.send(f"Congratulations {self.player.mention}! You've won {self.winning_amount} {coin_icon}!")
                 ActivityTracker = self.bot.get_cog('ActivityTracker')
-                ActivityTracker.update_coins(self.player.id, self.winning_amount)
+                await ActivityTracker.aio.update_coins(self.player.id, self.winning_amount, ledger.PAYOUT, 'gifthunt')
             elif final_gift == self.break_even_gift:
                 await self.ctx.send(f"You've won your ante of {self.bet} {coin_icon} back.")
                 ActivityTracker = self.bot.get_cog('ActivityTracker')
-                ActivityTracker.update_coins(self.player.id, self.bet)
+                await ActivityTracker.aio.update_coins(self.player.id, self.bet, ledger.REFUND, 'gifthunt')
             else:
                 await self.ctx.send(f"Sorry {self.player.mention}, you lost. Better luck next time!")
 
@@ -2,6 +2,7 @@ import os, random, json, math, asyncio, logging
 from datetime import datetime, timedelta, timezone
 from discord.ext import commands, tasks
 from settings.settings import load_settings
+from bot import ledger
 
 logging.basicConfig(level=logging.INFO)
 
@@ -112,5 +113,6 @@ class Lottery:
         # Update the winner's activity
         ActivityTracker = self.bot.get_cog('ActivityTracker')
         if winner:
-            ActivityTracker.update_coins(winner.id, current_pot)
-            await channel.send(content=f"Congratulations {winner.display_name}! Your new balance is {ActivityTracker.get_coins(winner.id)} {coin_icon}.")
\ No newline at end of file
+            await ActivityTracker.aio.update_coins(winner.id, current_pot, ledger.LOTTERY_PRIZE, 'lottery')
+            new_balance = await ActivityTracker.aio.get_coins(winner.id)
+            await channel.send(content=f"Congratulations {winner.display_name}! Your new balance is {new_balance} {coin_icon}.")
\ No newline at end of file
@@ -0,0 +1,60 @@
+# leaderboard.py
+import threading
+from bisect import bisect_left, insort
+
+
+class Leaderboard:
+    """Every user ordered by one metric, highest first.
+
+    Entries are kept in a sorted list of (-value, user_id), so the top k is a slice
+    and an update or a rank lookup is a bisect. version goes up whenever any value actually
+    changes, so readers can tell whether a previous result is stale.
+    """
+
+    def __init__(self):
+        self._entries = []
+        self._values = {}
+        self._lock = threading.Lock()
+        self.version = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def seed(self, rows):
+        # rows are (user_id, value)
+        with self._lock:
+            self._values = {str(user_id): value or 0 for user_id, value in rows}
+            self._entries = sorted((-value, user_id) for user_id, value in self._values.items())
+            self.version += 1
+
+    def update(self, user_id, value):
+        user_id = str(user_id)
+        value = value or 0
+        with self._lock:
+            old_value = self._values.get(user_id)
+            if old_value == value:
+                return
+            if old_value is not None:
+                del self._entries[bisect_left(self._entries, (-old_value, user_id))]
+            insort(self._entries, (-value, user_id))
+            self._values[user_id] = value
+            self.version += 1
+
+    def add(self, user_id):
+        # New users start at 0
+        if str(user_id) not in self._values:
+            self.update(user_id, 0)
+
+    def top(self, k):
+        """Returns [(user_id, value)] for the k highest values."""
+        with self._lock:
+            return [(user_id, -negative_value) for negative_value, user_id in self._entries[:k]]
+
+    def rank(self, user_id):
+        """Returns (rank, total) for a user in O(log n). Tied values share the better rank."""
+        user_id = str(user_id)
+        with self._lock:
+            value = self._values.get(user_id, 0)
+            total = len(self._entries) + (user_id not in self._values)
+            # Everyone with a strictly higher value sorts before (-value, '')
+            return bisect_left(self._entries, (-value, '')) + 1, total
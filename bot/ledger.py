@@ -0,0 +1,73 @@
+# ledger.py
+from datetime import datetime, timezone
+
+# Reason codes stored with every ledger entry
+OPENING_BALANCE = 'opening_balance'
+ADJUSTMENT = 'adjustment'
+RECONCILE = 'reconcile'
+ADMIN = 'admin'
+GIFT = 'gift'
+MUGGING = 'mugging'
+DAILY = 'daily'
+LOAN = 'loan'
+LEVEL_UP = 'level_up'
+REFERRAL = 'referral'
+BET = 'bet'
+PAYOUT = 'payout'
+REFUND = 'refund'
+LOTTERY_TICKET = 'lottery_ticket'
+LOTTERY_PRIZE = 'lottery_prize'
+LEGACY_IMPORT = 'legacy_import'
+
+
+def timestamp():
+    return datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def record(db, entries):
+    """Appends (user_id, amount, balance, reason, source) entries in one batch.
+
+    Call inside the transaction that changes user_info.Coins so the ledger and the
+    materialized balance always commit together. balance is the user's balance
+    after the entry.
+    """
+    created_at = timestamp()
+    db.executemany('INSERT INTO ledger ("User ID", Amount, Balance, Reason, Source, "Created At") VALUES (?, ?, ?, ?, ?, ?)',
+                   [(str(user_id), amount, balance, reason, source, created_at) for user_id, amount, balance, reason, source in entries])
+
+
+def reconcile(db):
+    """Checks user_info.Coins against the ledger and returns the adjustment entries it made.
+
+    Only entries written since the last checkpoint are read; they are folded into
+    the per-user running totals in ledger_totals, which are then compared with the
+    balances. A mismatch means something changed Coins without a ledger entry (a
+    raw query, a manual edit), so an adjustment entry is written to bring the ledger
+    back in line with the balance.
+    """
+    with db.transaction():
+        last_entry = db.fetchone('SELECT "Last Entry" FROM ledger_checkpoint WHERE id = 1')[0]
+        newest_entry = db.fetchone('SELECT COALESCE(MAX(id), 0) FROM ledger')[0]
+
+        if newest_entry > last_entry:
+            db.execute('''
+            INSERT INTO ledger_totals (ID, Total)
+            SELECT "User ID", SUM(Amount) FROM ledger WHERE id > ? AND id <= ? GROUP BY "User ID"
+            ON CONFLICT(ID) DO UPDATE SET Total = Total + excluded.Total''', (last_entry, newest_entry))
+
+        mismatches = db.fetchall('''
+        SELECT i.ID, i.Coins - COALESCE(t.Total, 0), i.Coins
+        FROM user_info i LEFT JOIN ledger_totals t ON t.ID = i.ID
+        WHERE i.Coins != COALESCE(t.Total, 0)''')
+
+        adjustments = [(user_id, difference, balance, RECONCILE, 'reconciliation') for user_id, difference, balance in mismatches]
+        if adjustments:
+            record(db, adjustments)
+            db.executemany('''
+            INSERT INTO ledger_totals (ID, Total) VALUES (?, ?)
+            ON CONFLICT(ID) DO UPDATE SET Total = Total + excluded.Total''', [(user_id, difference) for user_id, difference, _ in mismatches])
+            newest_entry = db.fetchone('SELECT MAX(id) FROM ledger')[0]
+
+        db.execute('UPDATE ledger_checkpoint SET "Last Entry" = ?, "Reconciled At" = ? WHERE id = 1', (newest_entry, timestamp()))
+
+    return adjustments
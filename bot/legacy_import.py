@@ -0,0 +1,216 @@
+# legacy_import.py
+# One-shot import of the two legacy stores, data/player_data.json and the old `users`
+# table, into user_info / user_stats / daily_stats / user_upgrades. Records are read
+# in chunks and written in batches; each batch commits together with its progress
+# marker in bot_state, so an interrupted import picks up where it stopped and
+# re-running a finished import changes nothing.
+import json
+import os
+from bot import ledger
+
+LEGACY_PLAYER_DATA = 'data/player_data.json'
+LEGACY_USERS_TABLE = 'users'
+
+IMPORT_BATCH_SIZE = 500
+READ_CHUNK_CHARS = 64 * 1024
+
+# bot_state keys holding how far each source has been imported
+PLAYER_DATA_PROGRESS = 'Legacy Import player_data.json'
+USERS_TABLE_PROGRESS = 'Legacy Import users'
+
+# Shop upgrades were stored on the player record as "<upgrade>_level"
+UPGRADE_SUFFIX = '_level'
+
+
+def iter_json_object(path, chunk_size=READ_CHUNK_CHARS):
+    """Yields the (key, value) pairs of a top-level JSON object, reading chunk_size characters at a time.
+
+    Only the record being decoded is held in memory, never the whole file.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, 'r') as f:
+        buffer, pos, eof = '', 0, False
+
+        def read_more():
+            nonlocal buffer, pos, eof
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buffer, pos = buffer[pos:] + chunk, 0
+
+        def skip_whitespace():
+            nonlocal pos
+            while True:
+                while pos < len(buffer) and buffer[pos].isspace():
+                    pos += 1
+                if pos < len(buffer) or eof:
+                    return
+                read_more()
+
+        def next_char():
+            nonlocal pos
+            skip_whitespace()
+            if pos >= len(buffer):
+                raise ValueError(f"Unexpected end of {path}")
+            pos += 1
+            return buffer[pos - 1]
+
+        def decode():
+            nonlocal pos
+            skip_whitespace()
+            while True:
+                try:
+                    value, end = decoder.raw_decode(buffer, pos)
+                    # A value running to the end of the buffer (a number, say) may continue in the next chunk
+                    if end < len(buffer) or eof:
+                        pos = end
+                        return value
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                read_more()
+
+        if next_char() != '{':
+            raise ValueError(f"{path} does not hold a JSON object")
+        skip_whitespace()
+        if buffer[pos:pos + 1] == '}':
+            return
+        while True:
+            key = decode()
+            if next_char() != ':':
+                raise ValueError(f"Expected ':' after {key!r} in {path}")
+            yield key, decode()
+            separator = next_char()
+            if separator == '}':
+                return
+            if separator != ',':
+                raise ValueError(f"Expected ',' or '}}' after {key!r} in {path}")
+
+
+def iter_batches(records, size=IMPORT_BATCH_SIZE):
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def iter_users_table(db, after_id, size=IMPORT_BATCH_SIZE):
+    """Yields batches of legacy `users` rows as (user_id, record) in ID order, starting after after_id."""
+    while True:
+        cursor = db.execute(f'SELECT * FROM {LEGACY_USERS_TABLE} WHERE id > ? ORDER BY id LIMIT ?', (after_id, size))
+        columns = [c[0] for c in cursor.description]
+        rows = cursor.fetchall()
+        if not rows:
+            return
+        yield [(str(row[0]), dict(zip(columns, row))) for row in rows]
+        after_id = rows[-1][0]
+
+
+def _int(value):
+    try:
+        return int(value or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def merge_batch(db, batch):
+    """Upserts a batch of (user_id, legacy record) pairs. Returns the ids that didn't exist before.
+
+    Conflict rules, chosen so a record can be merged any number of times:
+    - lifetime counters and points keep the larger of the current and legacy value
+    - cooldown timestamps keep the later one
+    - usernames and coin balances already in the database win; users who only exist
+      in the legacy store open with their legacy balance, recorded in the ledger
+    - upgrade levels keep the higher one
+    Levels aren't touched here; they're recomputed from points once the import is done.
+    """
+    ids = [user_id for user_id, _ in batch]
+    placeholders = ', '.join('?' * len(ids))
+    existing = {row[0] for row in db.fetchall(f'SELECT ID FROM user_info WHERE ID IN ({placeholders})', ids)}
+    new_ids = [user_id for user_id in ids if user_id not in existing]
+
+    records = dict(batch)
+    db.executemany('''
+    INSERT INTO user_info (ID, Username, Level, Points, Coins)
+    VALUES (?, ?, 1, ?, ?)
+    ON CONFLICT(ID) DO UPDATE SET
+        Username = COALESCE(Username, excluded.Username),
+        Points = MAX(COALESCE(Points, 0), excluded.Points)''',
+                   [(user_id, r.get('username'), _int(r.get('points')), _int(r.get('coins')) if user_id not in existing else 0)
+                    for user_id, r in batch])
+
+    db.executemany('''
+    INSERT INTO user_stats (ID, "Total Messages Sent", "Total Characters Typed", "Total Minutes Online", "Total Minutes in Voice Chat", "Last Daily", "Last Loan Disbursement")
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(ID) DO UPDATE SET
+        "Total Messages Sent" = MAX("Total Messages Sent", excluded."Total Messages Sent"),
+        "Total Characters Typed" = MAX("Total Characters Typed", excluded."Total Characters Typed"),
+        "Total Minutes Online" = MAX("Total Minutes Online", excluded."Total Minutes Online"),
+        "Total Minutes in Voice Chat" = MAX("Total Minutes in Voice Chat", excluded."Total Minutes in Voice Chat"),
+        "Last Daily" = NULLIF(MAX(COALESCE("Last Daily", ''), COALESCE(excluded."Last Daily", '')), ''),
+        "Last Loan Disbursement" = NULLIF(MAX(COALESCE("Last Loan Disbursement", ''), COALESCE(excluded."Last Loan Disbursement", '')), '')''',
+                   [(user_id, _int(r.get('messages_sent')), _int(r.get('characters_typed')), _int(r.get('minutes_online')),
+                     _int(r.get('minutes_in_voice')), r.get('last_daily'), r.get('last_loan_disbursement'))
+                    for user_id, r in batch])
+
+    # points_today belongs to a day that's long over, so daily_stats only needs its row
+    db.executemany('INSERT OR IGNORE INTO daily_stats (ID) VALUES (?)', [(user_id,) for user_id in ids])
+
+    upgrades = [(user_id, key[:-len(UPGRADE_SUFFIX)].capitalize(), _int(value))
+                for user_id, r in batch for key, value in r.items()
+                if key.endswith(UPGRADE_SUFFIX)]
+    db.executemany('''
+    INSERT INTO user_upgrades (ID, Upgrade, Level) VALUES (?, ?, ?)
+    ON CONFLICT(ID, Upgrade) DO UPDATE SET Level = MAX(Level, excluded.Level)''', upgrades)
+
+    ledger.record(db, [(user_id, _int(records[user_id].get('coins')), _int(records[user_id].get('coins')), ledger.LEGACY_IMPORT, 'legacy_import')
+                       for user_id in new_ids if _int(records[user_id].get('coins'))])
+    return new_ids
+
+
+def _get_progress(db, key, default):
+    row = db.fetchone('SELECT Value FROM bot_state WHERE Key = ?', (key,))
+    return row[0] if row else default
+
+
+def _set_progress(db, key, value):
+    db.execute('INSERT INTO bot_state (Key, Value) VALUES (?, ?) ON CONFLICT(Key) DO UPDATE SET Value = excluded.Value', (key, str(value)))
+
+
+def import_player_data(db, path=LEGACY_PLAYER_DATA):
+    """Merges player_data.json. Returns (records merged, new users)."""
+    if not os.path.exists(path):
+        return 0, 0
+
+    # Records are merged in file order, so progress is how many have been done
+    done = int(_get_progress(db, PLAYER_DATA_PROGRESS, 0))
+    records = ((str(user_id), record) for i, (user_id, record) in enumerate(iter_json_object(path)) if i >= done and isinstance(record, dict))
+    merged = created = 0
+    for batch in iter_batches(records):
+        with db.transaction():
+            created += len(merge_batch(db, batch))
+            _set_progress(db, PLAYER_DATA_PROGRESS, done + merged + len(batch))
+        merged += len(batch)
+    return merged, created
+
+
+def import_users_table(db):
+    """Merges the legacy users table. Returns (records merged, new users)."""
+    if not db.fetchone("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (LEGACY_USERS_TABLE,)):
+        return 0, 0
+
+    merged = created = 0
+    for batch in iter_users_table(db, _get_progress(db, USERS_TABLE_PROGRESS, '')):
+        with db.transaction():
+            created += len(merge_batch(db, batch))
+            _set_progress(db, USERS_TABLE_PROGRESS, batch[-1][0])
+        merged += len(batch)
+    return merged, created
+
+
+def import_legacy(db, path=LEGACY_PLAYER_DATA):
+    """Imports both legacy stores. Returns {source: (records merged, new users)}."""
+    return {'player_data.json': import_player_data(db, path), 'users': import_users_table(db)}
@@ -0,0 +1,56 @@
+# levels.py
+from bisect import bisect_right
+from math import isqrt
+import numpy as np
+
+# Going from level 1 to 2 takes 10000 points and from level L to L+1 takes (L+1)*5000,
+# so the points needed to finish level L sum to
+#   T(L) = 10000 + 5000 * ((L+1)(L+2)/2 - 3),  T(0) = 0
+TABLE_LEVELS = 2000
+
+
+def points_for_level_transition(level):
+    return 10000 if level == 1 else (level + 1) * 5000
+
+
+def points_for_next_level(current_level):
+    """Total points needed to finish current_level (T above)."""
+    if current_level <= 0:
+        return 0
+    return 10000 + 2500 * ((current_level + 1) * (current_level + 2) - 6)
+
+
+# THRESHOLDS[L] == points_for_next_level(L), so the level for some points is the
+# number of thresholds at or below them
+THRESHOLDS = [points_for_next_level(level) for level in range(TABLE_LEVELS + 1)]
+THRESHOLD_ARRAY = np.array(THRESHOLDS, dtype=np.int64)
+
+
+def level_for_points(points):
+    if points < THRESHOLDS[-1]:
+        return max(bisect_right(THRESHOLDS, points), 1)
+
+    # Past the table: invert the quadratic, then settle any rounding either way
+    level = max((isqrt(4 * (points // 2500) + 1) - 3) // 2, 1)
+    while points_for_next_level(level) <= points:
+        level += 1
+    while level > 1 and points_for_next_level(level - 1) > points:
+        level -= 1
+    return level
+
+
+def get_current_level(points):
+    """Returns the level for a points total and the size of that level in points."""
+    level = level_for_points(points)
+    return level, points_for_level_transition(level)
+
+
+def levels_for_points_array(points):
+    """Vectorized level_for_points for a whole column of points at once."""
+    points = np.asarray(points, dtype=np.int64)
+    levels = np.maximum(np.searchsorted(THRESHOLD_ARRAY, points, side='right'), 1)
+
+    beyond = points >= THRESHOLDS[-1]
+    if beyond.any():
+        levels[beyond] = [level_for_points(int(p)) for p in points[beyond]]
+    return levels
@@ -0,0 +1,197 @@
+# migrations.py
+from datetime import datetime, timezone
+from bot.levels import levels_for_points_array
+
+# Ordered list of (version, description, function). Each function receives the
+# Database and runs inside the transaction that records its version, so a
+# migration either applies completely or not at all.
+MIGRATIONS = []
+
+
+def migration(version, description):
+    def register(fn):
+        MIGRATIONS.append((version, description, fn))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return fn
+    return register
+
+
+def current_version(db):
+    row = db.fetchone('SELECT MAX(version) FROM schema_version')
+    return row[0] or 0
+
+
+def run_migrations(db):
+    """Bring the database up to the newest schema. Safe to call on every startup."""
+    db.execute('''
+    CREATE TABLE IF NOT EXISTS schema_version (
+        version INTEGER PRIMARY KEY,
+        description TEXT NOT NULL,
+        applied_at TEXT NOT NULL
+    )''')
+
+    applied = current_version(db)
+    for version, description, fn in MIGRATIONS:
+        if version <= applied:
+            continue
+        with db.transaction():
+            fn(db)
+            db.execute('INSERT INTO schema_version (version, description, applied_at) VALUES (?, ?, ?)',
+                       (version, description, datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')))
+        print(f"Applied database migration {version}: {description}")
+
+
+@migration(1, 'Key user_stats and daily_stats by ID and keep usernames only in user_info')
+def key_stats_tables(db):
+    # Any stats row without a parent gets one, so the new foreign keys hold
+    db.execute('''
+    INSERT OR IGNORE INTO user_info (ID, Username, Level, Points, Coins)
+    SELECT ID, MAX(Username), 1, 0, 0 FROM (
+        SELECT ID, Username FROM user_stats
+        UNION ALL
+        SELECT ID, Username FROM daily_stats
+    ) GROUP BY ID''')
+
+    # Rebuild both tables with ID as the primary key. Duplicate rows for the same
+    # user are merged by keeping the largest value of every column.
+    db.execute('''
+    CREATE TABLE user_stats_new (
+        "ID" TEXT PRIMARY KEY REFERENCES user_info("ID"),
+        "Total Messages Sent" INTEGER NOT NULL DEFAULT 0,
+        "Total Characters Typed" INTEGER NOT NULL DEFAULT 0,
+        "Total Minutes Online" INTEGER NOT NULL DEFAULT 0,
+        "Total Minutes in Voice Chat" INTEGER NOT NULL DEFAULT 0,
+        "Last Daily" TEXT,
+        "Last Loan Disbursement" TEXT,
+        "Voice Join Time" REAL
+    )''')
+    db.execute('''
+    INSERT INTO user_stats_new
+    SELECT ID, COALESCE(MAX("Total Messages Sent"), 0), COALESCE(MAX("Total Characters Typed"), 0),
+           COALESCE(MAX("Total Minutes Online"), 0), COALESCE(MAX("Total Minutes in Voice Chat"), 0),
+           MAX("Last Daily"), MAX("Last Loan Disbursement"), MAX("Voice Join Time")
+    FROM user_stats GROUP BY ID''')
+    db.execute('DROP TABLE user_stats')
+    db.execute('ALTER TABLE user_stats_new RENAME TO user_stats')
+
+    db.execute('''
+    CREATE TABLE daily_stats_new (
+        "ID" TEXT PRIMARY KEY REFERENCES user_info("ID"),
+        "Points Today" INTEGER NOT NULL DEFAULT 0,
+        "Messages Sent Today" INTEGER NOT NULL DEFAULT 0,
+        "Characters Typed Today" INTEGER NOT NULL DEFAULT 0,
+        "Minutes Online Today" INTEGER NOT NULL DEFAULT 0,
+        "Minutes in Voice Chat Today" INTEGER NOT NULL DEFAULT 0
+    )''')
+    db.execute('''
+    INSERT INTO daily_stats_new
+    SELECT ID, COALESCE(MAX("Points Today"), 0), COALESCE(MAX("Messages Sent Today"), 0),
+           COALESCE(MAX("Characters Typed Today"), 0), COALESCE(MAX("Minutes Online Today"), 0),
+           COALESCE(MAX("Minutes in Voice Chat Today"), 0)
+    FROM daily_stats GROUP BY ID''')
+    db.execute('DROP TABLE daily_stats')
+    db.execute('ALTER TABLE daily_stats_new RENAME TO daily_stats')
+
+    # Every user_info row gets matching stats rows
+    db.execute('INSERT OR IGNORE INTO user_stats (ID) SELECT ID FROM user_info')
+    db.execute('INSERT OR IGNORE INTO daily_stats (ID) SELECT ID FROM user_info')
+
+
+@migration(2, 'Index user_info for the coins and points leaderboards')
+def index_leaderboards(db):
+    db.execute('CREATE INDEX IF NOT EXISTS idx_user_info_coins ON user_info (Coins DESC)')
+    db.execute('CREATE INDEX IF NOT EXISTS idx_user_info_points ON user_info (Points DESC)')
+
+
+@migration(3, 'Add the coin ledger and seed it with opening balances')
+def create_ledger(db):
+    db.execute('''
+    CREATE TABLE ledger (
+        "id" INTEGER PRIMARY KEY,
+        "User ID" TEXT NOT NULL REFERENCES user_info("ID"),
+        "Amount" INTEGER NOT NULL,
+        "Balance" INTEGER NOT NULL,
+        "Reason" TEXT NOT NULL,
+        "Source" TEXT,
+        "Created At" TEXT NOT NULL
+    )''')
+    db.execute('CREATE INDEX idx_ledger_user ON ledger ("User ID", id)')
+
+    # Running per-user sums of the ledger up to the checkpoint, used by reconciliation
+    db.execute('''
+    CREATE TABLE ledger_totals (
+        "ID" TEXT PRIMARY KEY REFERENCES user_info("ID"),
+        "Total" INTEGER NOT NULL
+    ) WITHOUT ROWID''')
+    db.execute('''
+    CREATE TABLE ledger_checkpoint (
+        "id" INTEGER PRIMARY KEY CHECK (id = 1),
+        "Last Entry" INTEGER NOT NULL,
+        "Reconciled At" TEXT
+    )''')
+
+    now = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+    db.execute('''
+    INSERT INTO ledger ("User ID", Amount, Balance, Reason, Source, "Created At")
+    SELECT ID, Coins, Coins, 'opening_balance', 'migration', ? FROM user_info WHERE Coins != 0''', (now,))
+    db.execute('INSERT INTO ledger_totals (ID, Total) SELECT "User ID", SUM(Amount) FROM ledger GROUP BY "User ID"')
+    db.execute('INSERT INTO ledger_checkpoint (id, "Last Entry", "Reconciled At") SELECT 1, COALESCE(MAX(id), 0), ? FROM ledger', (now,))
+
+
+@migration(4, 'Backfill user_info.Level from points')
+def backfill_levels(db):
+    rows = db.fetchall('SELECT ID, COALESCE(Points, 0) FROM user_info')
+    if rows:
+        ids, points = zip(*rows)
+        db.executemany('UPDATE user_info SET Level = ? WHERE ID = ?', zip(levels_for_points_array(points).tolist(), ids))
+
+
+@migration(5, 'Add daily_history for archived daily_stats and a bot_state table')
+def create_daily_history(db):
+    # One row per user per day they were active. WITHOUT ROWID keeps the rows
+    # clustered on (ID, Day) so a user's history is a single range read.
+    db.execute('''
+    CREATE TABLE daily_history (
+        "ID" TEXT NOT NULL REFERENCES user_info("ID"),
+        "Day" TEXT NOT NULL,
+        "Points" INTEGER NOT NULL,
+        "Messages Sent" INTEGER NOT NULL,
+        "Characters Typed" INTEGER NOT NULL,
+        "Minutes Online" INTEGER NOT NULL,
+        "Minutes in Voice Chat" INTEGER NOT NULL,
+        PRIMARY KEY ("ID", "Day")
+    ) WITHOUT ROWID''')
+    db.execute('CREATE INDEX idx_daily_history_day ON daily_history ("Day")')
+
+    db.execute('''
+    CREATE TABLE bot_state (
+        "Key" TEXT PRIMARY KEY,
+        "Value" TEXT
+    )''')
+
+
+@migration(6, 'Add activity_buckets for hourly, daily and weekly activity')
+def create_activity_buckets(db):
+    db.execute('''
+    CREATE TABLE activity_buckets (
+        "ID" TEXT NOT NULL REFERENCES user_info("ID"),
+        "Resolution" TEXT NOT NULL CHECK (Resolution IN ('hour', 'day', 'week')),
+        "Bucket Start" INTEGER NOT NULL,
+        "Messages Sent" INTEGER NOT NULL DEFAULT 0,
+        "Characters Typed" INTEGER NOT NULL DEFAULT 0,
+        "Minutes in Voice Chat" INTEGER NOT NULL DEFAULT 0,
+        "Minutes Online" INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY ("ID", "Resolution", "Bucket Start")
+    ) WITHOUT ROWID''')
+
+
+@migration(7, 'Add user_upgrades for shop upgrade levels')
+def create_user_upgrades(db):
+    # Upgrade levels used to live in data/player_data.json; they're imported by !importlegacy
+    db.execute('''
+    CREATE TABLE user_upgrades (
+        "ID" TEXT NOT NULL REFERENCES user_info("ID"),
+        "Upgrade" TEXT NOT NULL,
+        "Level" INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY ("ID", "Upgrade")
+    ) WITHOUT ROWID''')
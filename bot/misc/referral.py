@@ -3,6 +3,7 @@ import json
 import os
 from discord.ext import commands
 from settings.settings import load_settings
+from bot import ledger
 from datetime import datetime, timezone
 
 # Load game settings from a JSON file
@@ -87,8 +88,8 @@ class ReferralTracker(commands.Cog):
             if ActivityTracker:
                 try:
                     # Update the inviter's and the new member's coin balance
-                    ActivityTracker.update_coins(inviter.id, INVITE_REWARD)
-                    ActivityTracker.update_coins(member.id, INVITE_REWARD)
+                    await ActivityTracker.aio.update_coins(inviter.id, INVITE_REWARD, ledger.REFERRAL, 'referral')
+                    await ActivityTracker.aio.update_coins(member.id, INVITE_REWARD, ledger.REFERRAL, 'referral')
 
                     # Announce the successful invite in the "lickertalk" channel
                     lickertalk_channel = discord.utils.get(member.guild.text_channels, name='licker-talk')
@@ -0,0 +1,84 @@
+# user_cache.py
+import threading
+from collections import OrderedDict
+
+# Columns held for each cached user; the first four come from user_info, the rest from user_stats
+RECORD_FIELDS = (
+    'Username',
+    'Level',
+    'Points',
+    'Coins',
+    'Total Messages Sent',
+    'Total Characters Typed',
+    'Total Minutes Online',
+    'Total Minutes in Voice Chat',
+)
+
+
+class UserCache:
+    """Bounded LRU of user records kept in front of the ActivityTracker accessors.
+
+    The cache is write-through: ActivityTracker updates cached records whenever it
+    changes the underlying rows, so a cached record always matches the database.
+    Records that aren't cached are simply left alone and get loaded on the next read.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._records = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, user_id):
+        user_id = str(user_id)
+        with self._lock:
+            record = self._records.get(user_id)
+            if record is None:
+                self.misses += 1
+                return None
+            self._records.move_to_end(user_id)
+            self.hits += 1
+            return record
+
+    def put(self, user_id, record):
+        user_id = str(user_id)
+        with self._lock:
+            self._records[user_id] = record
+            self._records.move_to_end(user_id)
+            while len(self._records) > self.capacity:
+                self._records.popitem(last=False)
+                self.evictions += 1
+
+    def set(self, user_id, field, value):
+        with self._lock:
+            record = self._records.get(str(user_id))
+            if record is not None:
+                record[field] = value
+
+    def adjust(self, user_id, field, delta):
+        with self._lock:
+            record = self._records.get(str(user_id))
+            if record is not None:
+                record[field] += delta
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._records.pop(str(user_id), None)
+
+    def clear(self):
+        with self._lock:
+            self._records.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._records),
+                'capacity': self.capacity,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
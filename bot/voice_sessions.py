@@ -0,0 +1,115 @@
+# voice_sessions.py
+import json
+import os
+
+VOICE_SESSIONS_CHECKPOINT = 'data/serverside/voice_sessions.json'
+
+
+class VoiceSession:
+    def __init__(self, username, channel_id, paused, last_seen, carry=0.0):
+        self.username = username
+        self.channel_id = channel_id
+        self.paused = paused
+        self.last_seen = last_seen
+        self.carry = carry  # seconds accrued but not yet credited as a whole minute
+
+    def accrue(self, now):
+        if not self.paused:
+            self.carry += max(now - self.last_seen, 0)
+        self.last_seen = now
+
+    def take_minutes(self):
+        minutes = int(self.carry // 60)
+        self.carry -= minutes * 60
+        return minutes
+
+
+class VoiceSessions:
+    """Open voice sessions, kept in memory and credited in bulk on every tick.
+
+    Only time spent unpaused counts. A session is paused while its member is deafened
+    or sitting in the guild's AFK channel. Voice events just move the accrual
+    boundary; whole minutes are handed out by tick(), including minutes from sessions
+    that ended since the last tick.
+    """
+
+    def __init__(self):
+        self.sessions = {}
+        self._pending = {}
+
+    def __len__(self):
+        return len(self.sessions)
+
+    def _add_pending(self, user_id, username, minutes):
+        if minutes:
+            _, previous = self._pending.get(user_id, (username, 0))
+            self._pending[user_id] = (username, previous + minutes)
+
+    def join(self, user_id, username, channel_id, paused, now):
+        self.sessions[user_id] = VoiceSession(username, channel_id, paused, now)
+
+    def update(self, user_id, username, channel_id, paused, now):
+        # Channel move, mute/deafen or AFK change while staying connected
+        session = self.sessions.get(user_id)
+        if session is None:
+            self.join(user_id, username, channel_id, paused, now)
+            return
+        session.accrue(now)
+        session.username = username
+        session.channel_id = channel_id
+        session.paused = paused
+
+    def leave(self, user_id, now):
+        session = self.sessions.pop(user_id, None)
+        if session is None:
+            return
+        session.accrue(now)
+        self._add_pending(user_id, session.username, session.take_minutes())
+
+    def tick(self, now):
+        """Returns [(user_id, username, minutes)] to credit since the last tick."""
+        for user_id, session in self.sessions.items():
+            session.accrue(now)
+            self._add_pending(user_id, session.username, session.take_minutes())
+
+        credited = [(user_id, username, minutes) for user_id, (username, minutes) in self._pending.items()]
+        self._pending = {}
+        return credited
+
+    def snapshot(self):
+        return {
+            user_id: {'username': s.username, 'channel_id': s.channel_id, 'paused': s.paused, 'last_seen': s.last_seen, 'carry': s.carry}
+            for user_id, s in self.sessions.items()
+        }
+
+    def restore(self, checkpoint, live, now):
+        """Rebuilds sessions after a restart.
+
+        checkpoint is a snapshot() saved before the restart and live maps user_id to
+        (username, channel_id, paused) for everyone in voice right now. Members still
+        in voice keep their uncredited seconds; time between the checkpoint and now is
+        unknown, so it isn't counted. Everyone else in voice starts a fresh session.
+        """
+        self.sessions = {}
+        for user_id, (username, channel_id, paused) in live.items():
+            saved = checkpoint.get(user_id)
+            self.sessions[user_id] = VoiceSession(username, channel_id, paused, now, saved['carry'] if saved else 0.0)
+
+
+def load_checkpoint(path=VOICE_SESSIONS_CHECKPOINT):
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"Could not read voice session checkpoint {path}: {e}")
+        return {}
+
+
+def save_checkpoint(snapshot, path=VOICE_SESSIONS_CHECKPOINT):
+    # Write to a temporary file and swap it in so a crash mid-write can't corrupt the checkpoint
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w') as f:
+        json.dump(snapshot, f)
+    os.replace(temp_path, path)
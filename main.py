@@ -8,6 +8,7 @@ from settings.settings import load_settings
 from dotenv import load_dotenv
 from flask import Flask
 from threading import Thread
+from utils.render_pool import render_pool
 
 load_dotenv(dotenv_path='settings/.env')
 TOKEN = os.getenv('TOKEN')
@@ -29,12 +30,10 @@ def signal_handler(signal, frame):
     update_status_offline()
     sys.exit(0)
 
-signal.signal(signal.SIGINT, signal_handler)
-signal.signal(signal.SIGTERM, signal_handler)
-
 @bot.event
 async def on_ready():
     print(f'Logged in as {bot.user.name}')
+    render_pool.start()
     await bot.load_extension('bot.activity_tracker')
     await bot.load_extension('bot.commands')
     await bot.load_extension('bot.games.game_manager')
@@ -52,4 +51,9 @@ async def on_ready():
     else:
         print(f"Failed to update bot status. Error: {process.stderr}")
 
-bot.run(TOKEN)
+# Render workers are spawned processes that import this module, so only the real
+# process installs the signal handlers and runs the bot
+if __name__ == '__main__':
+    signal.signal(signal.SIGINT, signal_handler)
+    signal.signal(signal.SIGTERM, signal_handler)
+    bot.run(TOKEN)
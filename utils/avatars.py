@@ -0,0 +1,112 @@
+# avatars.py
+# Avatars for rendered cards, decoded and resized to the size the card needs. Lookups go
+# memory -> disk -> Discord's CDN. Both caches are keyed by the avatar's hash, so a user
+# who changes their avatar misses and gets the new one, and the stale entries are dropped.
+import asyncio
+import glob
+import os
+from collections import OrderedDict
+from io import BytesIO
+import aiohttp
+from PIL import Image
+
+AVATAR_CACHE_DIR = 'data/serverside/avatars'
+AVATAR_CACHE_SIZE = 256
+AVATAR_FETCH_SIZE = 256
+AVATAR_FETCH_TIMEOUT = 5
+
+
+class AvatarService:
+    def __init__(self, size, cache_dir=AVATAR_CACHE_DIR, capacity=AVATAR_CACHE_SIZE, timeout=AVATAR_FETCH_TIMEOUT):
+        self.size = size
+        self.cache_dir = cache_dir
+        self.capacity = capacity
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.session = None
+        # user_id -> (avatar hash, resized RGBA image), least recently used first
+        self._images = OrderedDict()
+        # (user_id, avatar hash) -> task, so concurrent requests for one avatar share a download
+        self._pending = {}
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    def _path(self, user_id, avatar_hash):
+        return os.path.join(self.cache_dir, f"{user_id}_{avatar_hash}.png")
+
+    def _remember(self, user_id, avatar_hash, image):
+        self._images[user_id] = (avatar_hash, image)
+        self._images.move_to_end(user_id)
+        while len(self._images) > self.capacity:
+            self._images.popitem(last=False)
+
+    async def get(self, member):
+        """Returns the member's avatar as a resized RGBA image, or None if it can't be fetched in time."""
+        asset = member.display_avatar
+        user_id = str(member.id)
+
+        cached = self._images.get(user_id)
+        if cached is not None and cached[0] == asset.key:
+            self._images.move_to_end(user_id)
+            return cached[1]
+
+        key = (user_id, asset.key)
+        task = self._pending.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._load(user_id, asset))
+            self._pending[key] = task
+            task.add_done_callback(lambda _: self._pending.pop(key, None))
+        image = await asyncio.shield(task)
+        if image is not None:
+            self._remember(user_id, asset.key, image)
+        return image
+
+    async def _load(self, user_id, asset):
+        path = self._path(user_id, asset.key)
+        image = await asyncio.to_thread(self._read_disk, path)
+        if image is not None:
+            return image
+
+        data = await self._download(asset.with_static_format('png').with_size(AVATAR_FETCH_SIZE).url)
+        if data is None:
+            return None
+        try:
+            return await asyncio.to_thread(self._decode_and_store, user_id, path, data)
+        except Exception as e:
+            print(f"Could not decode avatar for {user_id}: {e}")
+            return None
+
+    async def _download(self, url):
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(timeout=self.timeout)
+        try:
+            async with self.session.get(url) as response:
+                response.raise_for_status()
+                return await response.read()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            print(f"Could not fetch avatar {url}: {e!r}")
+            return None
+
+    def _read_disk(self, path):
+        if not os.path.exists(path):
+            return None
+        try:
+            with Image.open(path) as image:
+                return image.convert('RGBA')
+        except OSError:
+            return None
+
+    def _decode_and_store(self, user_id, path, data):
+        with Image.open(BytesIO(data)) as image:
+            resized = image.convert('RGBA').resize(self.size)
+
+        # Files for the user's previous avatars are stale now
+        os.makedirs(self.cache_dir, exist_ok=True)
+        for old_path in glob.glob(os.path.join(self.cache_dir, f"{user_id}_*.png")):
+            os.remove(old_path)
+        temp_path = path + '.tmp'
+        resized.save(temp_path, format='PNG')
+        os.replace(temp_path, path)
+        return resized
@@ -0,0 +1,53 @@
+# cards.py
+# Playing card images for the card games. All 52 faces and the card back are decoded
+# once when this module is imported and kept as RGB images indexed by card id, so
+# drawing a hand is just pastes in memory.
+import os
+from PIL import Image
+
+DECK_OF_CARDS_FOLDER = 'utils/images/deckofcards'
+RANKS = ('2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K', 'A')
+SUITS = ('C', 'D', 'H', 'S')
+
+# Card ids are rank * 4 + suit for the faces; the back comes after them
+BACK = len(RANKS) * len(SUITS)
+
+
+def card_id(card):
+    """Id of a card string such as 'AS' or '10H'."""
+    return RANKS.index(card[:-1].upper()) * len(SUITS) + SUITS.index(card[-1].upper())
+
+
+def card_path(card):
+    if card == BACK:
+        return os.path.join(DECK_OF_CARDS_FOLDER, 'back.png')
+    rank, suit = RANKS[card // len(SUITS)], SUITS[card % len(SUITS)]
+    return os.path.join(DECK_OF_CARDS_FOLDER, rank, f'{rank}{suit}.png')
+
+
+def load_card_images():
+    images = []
+    for card in range(BACK + 1):
+        with Image.open(card_path(card)) as image:
+            images.append(image.convert('RGB'))
+    return images
+
+
+CARD_IMAGES = load_card_images()
+
+
+def hand_image(cards, vertical=False):
+    """Lays out card ids side by side (or stacked when vertical) in one image."""
+    images = [CARD_IMAGES[card] for card in cards]
+    widths, heights = zip(*(image.size for image in images))
+    if vertical:
+        size = (max(widths), sum(heights))
+    else:
+        size = (sum(widths), max(heights))
+
+    hand = Image.new('RGB', size)
+    offset = 0
+    for image in images:
+        hand.paste(image, (0, offset) if vertical else (offset, 0))
+        offset += image.size[1] if vertical else image.size[0]
+    return hand
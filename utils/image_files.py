@@ -0,0 +1,20 @@
+# image_files.py
+# Every image the bot sends goes through image_file(): it's encoded into memory and
+# handed to discord.File directly, so nothing is written to, read back from or
+# deleted under utils/images, and concurrent games can't clobber each other's files.
+from io import BytesIO
+import discord
+
+
+def encode_png(image):
+    """Encodes a PIL image as PNG bytes."""
+    image_buffer = BytesIO()
+    image.save(image_buffer, format='PNG')
+    return image_buffer.getvalue()
+
+
+def image_file(image, filename):
+    """Wraps a PIL image or already encoded PNG bytes in a discord.File. Each File can only be sent once."""
+    if not isinstance(image, (bytes, bytearray)):
+        image = encode_png(image)
+    return discord.File(BytesIO(image), filename=filename)
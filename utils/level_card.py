@@ -0,0 +1,86 @@
+# level_card.py
+# Pillow renderer for the !level card. Everything that looks the same on every card
+# (background, empty progress bar, fonts) is drawn once into a template; a render copies
+# the template and only adds the avatar, the text and the filled part of the bar.
+# Nothing here touches shared mutable state, so cards can be rendered from any thread.
+import threading
+from functools import lru_cache
+from io import BytesIO
+from PIL import Image, ImageDraw, ImageFont
+
+CARD_SIZE = (1000, 250)
+BACKGROUND_COLOR = (255, 127, 80)
+BAR_BACKGROUND_COLOR = (255, 255, 255, 77)  # white at 30% opacity
+BAR_FILL_COLOR = (76, 175, 80)
+TEXT_COLOR = 'white'
+SHADOW_COLOR = 'black'
+SHADOW_OFFSET = 2
+
+AVATAR_SIZE = (250, 225)
+AVATAR_POSITION = (10, 12)
+
+BAR_X, BAR_Y = 397, 160
+BAR_WIDTH, BAR_HEIGHT = 450, 70
+
+# Bold fonts to try in order; Verdana matches the old matplotlib card
+FONT_CANDIDATES = ('verdanab.ttf', 'Verdana Bold.ttf', 'DejaVuSans-Bold.ttf')
+TITLE_FONT_SIZE = 50
+POINTS_FONT_SIZE = 30
+PROGRESS_FONT_SIZE = 40
+
+_template = None
+_template_lock = threading.Lock()
+
+
+@lru_cache(maxsize=None)
+def load_font(size):
+    for name in FONT_CANDIDATES:
+        try:
+            return ImageFont.truetype(name, size)
+        except OSError:
+            continue
+    return ImageFont.load_default(size)
+
+
+def get_template():
+    global _template
+    if _template is None:
+        with _template_lock:
+            if _template is None:
+                template = Image.new('RGBA', CARD_SIZE, BACKGROUND_COLOR)
+                bar = Image.new('RGBA', CARD_SIZE, (0, 0, 0, 0))
+                ImageDraw.Draw(bar).rectangle((BAR_X, BAR_Y, BAR_X + BAR_WIDTH - 1, BAR_Y + BAR_HEIGHT - 1), fill=BAR_BACKGROUND_COLOR)
+                _template = Image.alpha_composite(template, bar)
+    return _template
+
+
+def draw_text(draw, position, text, font, anchor):
+    x, y = position
+    draw.text((x + SHADOW_OFFSET, y + SHADOW_OFFSET), text, font=font, fill=SHADOW_COLOR, anchor=anchor)
+    draw.text((x, y), text, font=font, fill=TEXT_COLOR, anchor=anchor)
+
+
+def render_level_card(username, level, progress, points, next_level, avatar=None):
+    """Renders the level card and returns the PNG bytes. avatar is an RGBA image already at AVATAR_SIZE, if any."""
+    card = get_template().copy()
+
+    if avatar is not None:
+        card.paste(avatar, AVATAR_POSITION, avatar)
+
+    draw = ImageDraw.Draw(card)
+    fill_width = round(max(min(progress, 100), 0) / 100 * BAR_WIDTH)
+    if fill_width > 0:
+        draw.rectangle((BAR_X, BAR_Y, BAR_X + fill_width - 1, BAR_Y + BAR_HEIGHT - 1), fill=BAR_FILL_COLOR)
+
+    title_font = load_font(TITLE_FONT_SIZE)
+    draw_text(draw, (275, 50), username, title_font, 'lm')
+    draw_text(draw, (275, 100), f"Points: {points}", load_font(POINTS_FONT_SIZE), 'lm')
+    # Level numbers sit slightly below the middle of the bar, like on the old card
+    level_y = BAR_Y + BAR_HEIGHT // 2 + 12
+    draw_text(draw, (BAR_X - 10, level_y), f"{level}", title_font, 'rm')
+    draw_text(draw, (BAR_X + BAR_WIDTH // 2, BAR_Y + BAR_HEIGHT // 2), f"{progress:.2f}%", load_font(PROGRESS_FONT_SIZE), 'mm')
+    draw_text(draw, (BAR_X + BAR_WIDTH + 10, level_y), f"{next_level}", title_font, 'lm')
+
+    image_buffer = BytesIO()
+    card.convert('RGB').save(image_buffer, format='PNG')
+    return image_buffer.getvalue()
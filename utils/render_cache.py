@@ -0,0 +1,70 @@
+# render_cache.py
+# Encoded images keyed by a hash of exactly what they show. Two requests that would
+# draw the same rows get the same key, so a repeat !leaderboard is a dict lookup
+# instead of a render; as soon as a displayed name or value changes, so does the key.
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from utils.render_pool import render_pool
+
+RENDER_CACHE_TTL_SECONDS = 300
+RENDER_CACHE_MAX_BYTES = 16 * 1024 * 1024
+
+
+def render_key(kind, **spec):
+    """Content hash of a render request: the renderer plus every argument it draws from."""
+    payload = json.dumps([kind, spec], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class RenderCache:
+    """PNG bytes by render_key, dropped after ttl seconds or least recently used first once over max_bytes."""
+
+    def __init__(self, ttl=RENDER_CACHE_TTL_SECONDS, max_bytes=RENDER_CACHE_MAX_BYTES):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (expires at, image)
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] <= time.monotonic():
+            self._drop(key)
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key, image):
+        if len(image) > self.max_bytes:
+            return
+        if key in self._entries:
+            self._drop(key)
+        self._entries[key] = (time.monotonic() + self.ttl, image)
+        self.size += len(image)
+        while self.size > self.max_bytes:
+            self._drop(next(iter(self._entries)))
+
+    def _drop(self, key):
+        _, image = self._entries.pop(key)
+        self.size -= len(image)
+
+
+# Shared by every cog
+render_cache = RenderCache()
+
+
+async def cached_render(kind, **spec):
+    """render_pool.render() through render_cache. Raises RenderError like render() does."""
+    key = render_key(kind, **spec)
+    image = render_cache.get(key)
+    if image is None:
+        image = await render_pool.render(kind, **spec)
+        render_cache.put(key, image)
+    return image
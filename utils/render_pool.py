@@ -0,0 +1,98 @@
+# render_pool.py
+# Image rendering off the event loop. Renders run in a small pool of worker processes
+# that import matplotlib and load fonts when they start, so a render never blocks the
+# gateway heartbeat, several can run on separate cores, and pyplot's global state is
+# never shared between two renders. A render is a renderer name plus keyword arguments
+# that pickle; the result is PNG bytes.
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+RENDER_WORKERS = 2
+# Renders running or waiting; past this, new requests are turned away instead of piling up
+RENDER_QUEUE_SIZE = 8
+RENDER_TIMEOUT_SECONDS = 20
+
+
+class RenderError(Exception):
+    pass
+
+
+def _renderers():
+    from utils import graphics, shop_card
+    return {
+        'level_card': graphics.generate_level_image,
+        'statistics': graphics.generate_statistics_visualization,
+        'table': graphics.render_table,
+        'shop': shop_card.render_shop_card,
+    }
+
+
+def _warm_up():
+    # Runs once in each worker: pick a non-GUI backend, then pay for the imports and
+    # font loading here rather than on the first real render
+    import matplotlib
+    matplotlib.use('Agg')
+    from utils import graphics, level_card
+    graphics.render_table(['warm'], [['up']], (1, 1), 10, (1, 1), 1)
+    level_card.load_font(level_card.TITLE_FONT_SIZE)
+
+
+def _ready():
+    return True
+
+
+def _render(kind, spec):
+    return _renderers()[kind](**spec)
+
+
+class RenderPool:
+    def __init__(self, workers=RENDER_WORKERS, queue_size=RENDER_QUEUE_SIZE, timeout=RENDER_TIMEOUT_SECONDS):
+        self.workers = workers
+        self.timeout = timeout
+        self._slots = asyncio.Semaphore(queue_size)
+        self._executor = None
+
+    def start(self):
+        """Starts the workers in the background. render() also starts them on first use."""
+        if self._executor is None:
+            # spawn rather than fork: the bot's threads (database worker, event loop) aren't safe to fork
+            self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'), initializer=_warm_up)
+            for _ in range(self.workers):
+                self._executor.submit(_ready)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def render(self, kind, **spec):
+        """Renders in a worker and returns the PNG bytes. Raises RenderError when busy, slow or failing."""
+        if self._slots.locked():
+            raise RenderError("too many images are being drawn right now, try again in a moment")
+
+        async with self._slots:
+            self.start()
+            future = self._executor.submit(_render, kind, spec)
+            try:
+                image = await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+            except asyncio.TimeoutError:
+                # The worker can't be interrupted; it finishes the render and the result is dropped
+                future.cancel()
+                print(f"Render of {kind} timed out after {self.timeout} seconds")
+                raise RenderError("drawing the image took too long")
+            except Exception as e:
+                print(f"Render of {kind} failed: {e!r}")
+                if isinstance(e, BrokenProcessPool):
+                    # A worker died; start a fresh pool on the next render
+                    self._executor = None
+                raise RenderError("something went wrong while drawing the image") from e
+
+        if image is None:
+            raise RenderError("something went wrong while drawing the image")
+        return image
+
+
+# Shared by every cog
+render_pool = RenderPool()
@@ -0,0 +1,56 @@
+# shop_card.py
+# Pillow renderer for the !shop table. The header and one row per upgrade, with its
+# name and rules, are the same for everyone, so they're drawn once per upgrade list;
+# a render copies that and only writes the user's levels into the second column.
+from functools import lru_cache
+from io import BytesIO
+from PIL import Image, ImageDraw
+from utils.level_card import load_font
+
+COLUMNS = ('ATTRIBUTES', 'LEVEL')
+CARD_WIDTH = 600
+ATTRIBUTE_COLUMN_WIDTH = 360
+LEVEL_X = ATTRIBUTE_COLUMN_WIDTH + (CARD_WIDTH - ATTRIBUTE_COLUMN_WIDTH) // 2  # center of the level column
+HEADER_HEIGHT = 70
+ROW_HEIGHT = 56
+PADDING = 20
+
+BACKGROUND_COLOR = 'white'
+TEXT_COLOR = 'black'
+RULE_COLOR = 'black'
+
+HEADER_FONT_SIZE = 34
+ROW_FONT_SIZE = 28
+
+
+@lru_cache(maxsize=8)
+def get_template(upgrade_names):
+    height = HEADER_HEIGHT + ROW_HEIGHT * len(upgrade_names)
+    template = Image.new('RGB', (CARD_WIDTH, height), BACKGROUND_COLOR)
+    draw = ImageDraw.Draw(template)
+
+    header_font = load_font(HEADER_FONT_SIZE)
+    header_y = HEADER_HEIGHT // 2
+    draw.text((PADDING, header_y), COLUMNS[0], font=header_font, fill=TEXT_COLOR, anchor='lm')
+    draw.text((LEVEL_X, header_y), COLUMNS[1], font=header_font, fill=TEXT_COLOR, anchor='mm')
+
+    row_font = load_font(ROW_FONT_SIZE)
+    for i, name in enumerate(upgrade_names):
+        top = HEADER_HEIGHT + i * ROW_HEIGHT
+        draw.line((0, top, CARD_WIDTH, top), fill=RULE_COLOR, width=2)
+        draw.text((PADDING, top + ROW_HEIGHT // 2), name, font=row_font, fill=TEXT_COLOR, anchor='lm')
+    draw.line((0, height - 2, CARD_WIDTH, height - 2), fill=RULE_COLOR, width=2)
+    return template
+
+
+def render_shop_card(rows):
+    """Renders [(upgrade name, level)] as the shop table and returns the PNG bytes."""
+    card = get_template(tuple(name for name, _ in rows)).copy()
+    draw = ImageDraw.Draw(card)
+    row_font = load_font(ROW_FONT_SIZE)
+    for i, (_, level) in enumerate(rows):
+        draw.text((LEVEL_X, HEADER_HEIGHT + i * ROW_HEIGHT + ROW_HEIGHT // 2), str(level), font=row_font, fill=TEXT_COLOR, anchor='mm')
+
+    image_buffer = BytesIO()
+    card.save(image_buffer, format='PNG')
+    return image_buffer.getvalue()